@@ -0,0 +1,195 @@
+import numpy as np
+import pandas as pd
+
+from kpi_chart import build_dataframe, normalize_columns
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:  # optional: only needed for Parquet registers
+    pq = None
+
+CHUNK_ROWS = 100_000
+
+# Headers accepted for a project-level register (one row per project)
+RAW_COLUMN_ALIASES = {
+    "Project": ["Project", "Project ID", "Project Id", "Project Code"],
+    "KPI": ["KPI"],
+    "Status": ["Status", "RAG", "RAG Status"],
+    "Score": ["Score", "Project Score", "Score (%)"],
+    "Period": ["Period", "Quarter", "Month"],
+    "Pillar": ["Pillar"],
+    "Objective": ["Objective", "Strategic Objective"],
+}
+REQUIRED_RAW_COLUMNS = ["KPI", "Status", "Score"]
+# Optional grouping columns kept alongside KPI, outermost first. Pillar and
+# Objective are only kept for the drill-down (by_hierarchy); otherwise a KPI
+# listed under several pillars is aggregated into one row, as before.
+HIERARCHY_COLUMNS = ["Pillar", "Objective"]
+GROUP_COLUMNS = ["Period"] + HIERARCHY_COLUMNS
+
+STATUS_VALUES = {
+    "green": "Green", "g": "Green",
+    "amber": "Amber", "a": "Amber", "orange": "Amber", "yellow": "Amber",
+    "red": "Red", "r": "Red",
+}
+
+
+def find_columns(df, aliases):
+    found = {}
+    for column, names in aliases.items():
+        match = next((c for c in df.columns if str(c).strip() in names), None)
+        if match is not None:
+            found[match] = column
+    return found
+
+
+def is_project_register(df):
+    return set(REQUIRED_RAW_COLUMNS) <= set(find_columns(df, RAW_COLUMN_ALIASES).values())
+
+
+def dropped_groups(by_period=True, by_hierarchy=False):
+    return ([] if by_period else ["Period"]) + ([] if by_hierarchy else HIERARCHY_COLUMNS)
+
+
+def clean_projects(raw, by_period=True, by_hierarchy=False, first_row=0):
+    # first_row: position of raw's first row in the whole register, for error messages
+    renames = find_columns(raw, RAW_COLUMN_ALIASES)
+    missing = [c for c in REQUIRED_RAW_COLUMNS if c not in renames.values()]
+    if missing:
+        raise ValueError(f"Missing column '{missing[0]}'")
+    raw = raw.rename(columns=renames)[list(renames.values())]
+    raw = raw.drop(columns=dropped_groups(by_period, by_hierarchy), errors="ignore")
+
+    status = raw["Status"].astype(str).str.strip().str.lower().map(STATUS_VALUES)
+    unknown = np.flatnonzero(status.isna())
+    if len(unknown):
+        raise ValueError(f"Unknown status '{raw['Status'].iloc[unknown[0]]}' in row {first_row + unknown[0] + 2}")
+
+    # Blank scores are allowed (project not scored yet); anything else must be a number
+    text = raw["Score"].astype(str).str.strip()
+    blank = raw["Score"].isna() | (text == "")
+    scores = pd.to_numeric(text.str.rstrip("%").where(~blank), errors="coerce")
+    invalid = np.flatnonzero(scores.isna() & ~blank)
+    if len(invalid):
+        raise ValueError(f"Score '{raw['Score'].iloc[invalid[0]]}' in row {first_row + invalid[0] + 2} is not a number")
+
+    # Categories in order of first appearance, so the chart keeps the register's KPI order
+    kpis = raw["KPI"].astype(str).str.strip()
+    projects = pd.DataFrame({
+        "KPI": pd.Categorical(kpis, categories=kpis.unique()),
+        "Status": pd.Categorical(status, categories=["Green", "Amber", "Red"]),
+        "Score": scores,
+    })
+    for position, column in enumerate(c for c in GROUP_COLUMNS if c in raw):
+        values = raw[column].astype(str).str.strip()
+        projects.insert(position, column, pd.Categorical(values, categories=values.unique()))
+    if "Project" in raw:
+        projects["Project"] = raw["Project"].astype(str).str.strip()
+    return projects
+
+
+# Aggregation works on partial sums so a register can be processed in chunks:
+# each chunk is reduced to per-KPI counts and score sums, which are added up.
+def partial_sums(projects):
+    keys = [c for c in GROUP_COLUMNS + ["KPI"] if c in projects]
+    # sort=False: groups in order of first appearance, not in category order
+    grouped = projects.groupby(keys, observed=True, sort=False)
+    scores = grouped["Score"].agg(["sum", "count"])
+    counts = grouped["Status"].value_counts().unstack(fill_value=0).reindex(columns=["Green", "Amber", "Red"], fill_value=0)
+    partial = counts.loc[scores.index]
+    partial["Score Sum"] = scores["sum"]
+    partial["Score Count"] = scores["count"]
+    # Plain string keys so partials from different chunks line up
+    partial.index = partial.index.set_levels([level.astype(str) for level in partial.index.levels]) \
+        if isinstance(partial.index, pd.MultiIndex) else partial.index.astype(str)
+    return partial
+
+
+def combine_partials(partials):
+    combined = pd.concat(partials)
+    # sort=False keeps the order in which KPIs (and periods) first appeared
+    return combined.groupby(level=list(range(combined.index.nlevels)), sort=False).sum()
+
+
+def finish_partials(totals):
+    # KPIs without any scored project keep a missing score, which the data checks flag
+    scores = (totals["Score Sum"] / totals["Score Count"].where(totals["Score Count"] > 0)).round(1)
+    kpis = totals.index.get_level_values(-1)
+    df = build_dataframe(
+        kpis.tolist(),
+        scores.tolist(),
+        totals["Green"].astype(int).tolist(),
+        totals["Amber"].astype(int).tolist(),
+        totals["Red"].astype(int).tolist(),
+    )
+    for level, column in enumerate(totals.index.names[:-1]):
+        df.insert(level, column, totals.index.get_level_values(level))
+    return df
+
+
+def aggregate_chunks(chunks, by_period=True, by_hierarchy=False, progress=None):
+    # A project listed more than once under the same KPI (and period, pillar, objective) is counted
+    # once, using its first row. Seen projects are remembered as 8-byte hashes.
+    totals = None
+    rows = 0
+    seen = np.empty(0, dtype=np.uint64)
+    for chunk in chunks:
+        # Row numbers run across chunks (Parquet batches each start their index at 0)
+        projects = clean_projects(chunk, by_period, by_hierarchy, first_row=rows)
+        rows += len(chunk)
+        if "Project" in projects:
+            keys = projects[[c for c in GROUP_COLUMNS + ["KPI", "Project"] if c in projects]].astype(str)
+            hashes = pd.util.hash_pandas_object(keys, index=False).to_numpy()
+            keep = ~pd.Series(hashes).duplicated().to_numpy() & ~np.isin(hashes, seen)
+            seen = np.union1d(seen, hashes)
+            projects = projects[keep].drop(columns="Project")
+        partial = partial_sums(projects)
+        totals = partial if totals is None else combine_partials([totals, partial])
+        if progress:
+            progress(rows)
+    if totals is None:
+        raise ValueError("The project register is empty")
+    return finish_partials(totals)
+
+
+# Streaming readers
+def iter_csv_chunks(source, chunk_rows=CHUNK_ROWS):
+    return pd.read_csv(source, chunksize=chunk_rows)
+
+
+def iter_parquet_chunks(source, chunk_rows=CHUNK_ROWS):
+    if pq is None:
+        raise ValueError("Reading Parquet files needs the pyarrow package")
+    for batch in pq.ParquetFile(source).iter_batches(batch_size=chunk_rows):
+        yield batch.to_pandas()
+
+
+def read_columns(source, parquet=False):
+    if parquet:
+        return pq.ParquetFile(source).schema_arrow.names if pq else []
+    return pd.read_csv(source, nrows=0).columns.tolist()
+
+
+def read_kpi_file(source, parquet=False, by_period=True, by_hierarchy=False, chunk_rows=CHUNK_ROWS, progress=None):
+    # Registers are aggregated chunk by chunk so memory stays bounded; per-KPI
+    # summaries are small and read whole
+    header = pd.DataFrame(columns=read_columns(source, parquet))
+    if hasattr(source, "seek"):
+        source.seek(0)
+    if is_project_register(header):
+        chunks = iter_parquet_chunks(source, chunk_rows) if parquet else iter_csv_chunks(source, chunk_rows)
+        return aggregate_chunks(chunks, by_period, by_hierarchy, progress)
+    df = pd.read_parquet(source) if parquet else pd.read_csv(source)
+    return normalize_summary(df, by_period, by_hierarchy)
+
+
+def normalize_summary(df, by_period=True, by_hierarchy=False):
+    # Per-KPI summary columns plus the grouping columns (Period, Pillar, Objective) that are kept
+    table = normalize_columns(df)
+    renames = find_columns(df, {column: RAW_COLUMN_ALIASES[column] for column in GROUP_COLUMNS})
+    dropped = dropped_groups(by_period, by_hierarchy)
+    groups = [(source, column) for source, column in renames.items() if column not in dropped]
+    groups.sort(key=lambda group: GROUP_COLUMNS.index(group[1]))
+    for position, (source, column) in enumerate(groups):
+        table.insert(position, column, df[source].astype(str).str.strip().to_numpy())
+    return table
@@ -1,156 +1,644 @@
-import streamlit as st
-import pandas as pd
-import matplotlib.pyplot as plt
 import io
-from matplotlib.lines import Line2D
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from kpi_chart import (
+    CHART_TITLES, LEGEND_STYLES, SCORE_LINE_STYLES, STACK_TYPES, LABEL_OPTIONS, EXPORT_FORMATS,
+    parse_column, build_dataframe, render_dashboard, export_figure,
+    compress_png, png_to_webp, format_size, draft_png, render_page, render_pages, page_count, get_page,
+    shared_ymax, fit_to_budget, paginate_to_budget, estimate_render_seconds, drawn_kpis, KPIS_PER_PAGE,
+    SORT_OPTIONS, arrange_kpis, validate_columns, MAX_INPUT_CHARS,
+    PASTED_COLUMNS, PERIOD_COLUMN,
+)
+from aggregate import HIERARCHY_COLUMNS, dropped_groups, read_kpi_file
+from heatmap import HEATMAP_METRICS, render_heatmap
+from comparison import COMPARISON_VIEWS, compare_datasets, render_comparison
+from report import pdf_report_bytes
+from summary import pillar_summary, summary_table
+from history import current_period, save_snapshot, load_index, history_pillars, query_history, render_trend
+from library import save_dataset, saved_datasets, load_dataset, delete_dataset
+from quality import quality_issues, exclude_issues
+from hierarchy import KPIHierarchy
+from grid import grid_table, blank_table, derive, grid_dataset
+from vega_chart import chart_spec
+
+HEATMAP_MODE = "Heatmap across periods"
+COMPARE_MODE = "Compare two periods"
+HIERARCHY_MODE = "Drill down (pillar → objective → KPI)"
+MODES = ["Single pillar", "All pillars dashboard", HEATMAP_MODE, COMPARE_MODE, HIERARCHY_MODE]
+SOURCES = ["Paste columns", "Upload project register (CSV or Parquet)", "Saved dataset", "Edit in grid"]
+REPORT_FORMAT = "PDF report (all pillars and pages)"
+PNG_DPIS = [100, 200, 300]
+PREVIEW_FORMATS = ["PNG", "Optimized PNG (palette)", "WebP"]
+PALETTE_COLORS = 64
+DISPLAY_BACKENDS = ["Server image (matplotlib)", "Interactive in browser (Vega-Lite)"]
+RENDER_BUDGETS = {"3 seconds (default)": 3.0, "1 second": 1.0, "10 seconds": 10.0, "No limit": None}
+PREVIEW_QUALITIES = ["Draft first, then full quality", "Full quality", "Draft only (full quality on export)"]
 
 st.set_page_config(layout="wide")
 st.title("📊 Manual KPI Chart Generator")
 
 # Inputs
-chart_title = st.selectbox(
-    "Select chart title:",
-    [
-        "Modern Infrastructure KPI Performance",
-        "Thriving Economy KPI Performance",
-        "Human Centric City KPI Performance",
-        "Effective Governance KPI Performance"
-    ]
-)
+mode = st.radio("Mode:", MODES, horizontal=True)
+if mode == HIERARCHY_MODE:
+    # Titles come from the selected pillar and objective
+    chart_title = "All pillars"
+elif mode != "All pillars dashboard":
+    chart_title = st.selectbox("Select chart title:", CHART_TITLES)
+
+if mode == HEATMAP_MODE:
+    options = (st.radio("Heatmap cells:", HEATMAP_METRICS),)
+elif mode == COMPARE_MODE:
+    options = (st.radio("Comparison view:", COMPARISON_VIEWS),)
+else:
+    legend_style = st.radio("Legend Style:", LEGEND_STYLES)
+    score_line_style = st.radio("Score Line Style:", SCORE_LINE_STYLES)
+    stack_type = st.radio("Bar Height:", STACK_TYPES)
+    label_option = st.radio("Chart Labels:", LABEL_OPTIONS)
+    col1, col2 = st.columns(2)
+    sort_by = col1.selectbox("Sort KPIs by:", SORT_OPTIONS)
+    top_n = col2.number_input("Show top N KPIs (0 = all, the rest are grouped as Others):", min_value=0, value=0, step=1)
+    options = (legend_style, score_line_style, stack_type, label_option)
+render_budget = RENDER_BUDGETS[st.selectbox("Render time budget:", list(RENDER_BUDGETS))]
+exclude_flagged = st.checkbox("Leave out rows that fail the data checks")
 
-legend_style = st.radio("Legend Style:", ["Separate (default)", "Unified (bottom combined legend)"])
-score_line_style = st.radio("Score Line Style:", ["Black line", "Colored dots by score"])
-stack_type = st.radio("Bar Height:", ["Raw counts (default)", "100% stacked (proportional)"])
-label_option = st.radio("Chart Labels:", ["No labels", "Show total only", "Show all segment labels"])
 
 # Data input areas
-st.markdown("### Paste your data below for each column (one item per line):")
-kpi_text = st.text_area("KPI")
-avg_score_text = st.text_area("Average Score (%)")
-green_text = st.text_area("Count of Green")
-amber_text = st.text_area("Count of Amber")
-red_text = st.text_area("Count of Red")
-
-# Score color logic
-def score_color(score):
-    if score < 60:
-        return "red"
-    elif score < 80:
-        return "orange"
+def data_inputs(prefix=None):
+    labels = ["KPI", "Average Score (%)", "Count of Green", "Count of Amber", "Count of Red"]
+    return [st.text_area(label, key=f"{prefix}:{label}" if prefix else None, max_chars=MAX_INPUT_CHARS)
+            for label in labels]
+
+
+# Each column is parsed and cached on its own (keyed by a hash of its text), so
+# correcting one text area only reparses that column
+@st.cache_data(show_spinner=False, max_entries=256)
+def parsed_column(text, position):
+    # Positions follow PASTED_COLUMNS, then the heatmap's Period column
+    return parse_column(text, position, PASTED_COLUMNS + [PERIOD_COLUMN])
+
+
+def read_dataset(texts, name=None, period_text=None):
+    # Sizes and column lengths (including the heatmap's Period column) are checked
+    # before any column is parsed
+    columns = PASTED_COLUMNS if period_text is None else PASTED_COLUMNS + [PERIOD_COLUMN]
+    texts = texts if period_text is None else [*texts, period_text]
+    try:
+        validate_columns(texts, columns=columns)
+        values = [parsed_column(text, position) for position, text in enumerate(texts)]
+    except ValueError as e:
+        where = f" ({name})" if name else ""
+        st.error(f"{e}{where}.")
+        return None
+    df = build_dataframe(*values[:len(PASTED_COLUMNS)])
+    if period_text is not None:
+        df.insert(0, "Period", values[-1])
+    return df
+
+
+# Raw project registers are aggregated to per-KPI counts and mean scores, chunk
+# by chunk, so only one chunk of parsed rows is held in memory at a time
+@st.cache_data(show_spinner=False, max_entries=8)
+def aggregate_register(data, parquet, by_period, by_hierarchy):
+    buffer = io.BytesIO(data)
+    bar = st.progress(0.0, "Aggregating project register...")
+    df = read_kpi_file(buffer, parquet, by_period, by_hierarchy,
+                       progress=lambda rows: bar.progress(min(buffer.tell() / max(len(data), 1), 1.0),
+                                                          f"Aggregating project register... {rows:,} rows"))
+    bar.empty()
+    return df
+
+
+# Saved datasets are keyed by content hash, so a reload after a save or rename is free
+@st.cache_data(show_spinner=False, max_entries=32)
+def saved_dataset(digest):
+    return load_dataset(digest)
+
+
+def latest_period(df):
+    # A dataset compared against another one stands for its latest period
+    if "Period" not in df:
+        return df
+    return df[df["Period"] == df["Period"].unique()[-1]].drop(columns="Period").reset_index(drop=True)
+
+
+# Chart spec -> encoded output. Cached per spec and format, so reruns (e.g. picking
+# an export format) reuse earlier renders and nothing is encoded until it is needed.
+def page_of(datasets, page, per_page=None):
+    # Each panel's `page`-th page of `per_page` KPIs; panels with fewer pages drop out
+    if not per_page:
+        return datasets
+    paged = {}
+    for title, df in datasets.items():
+        pages = page_count(df, per_page)
+        if page < pages:
+            paged[f"{title} ({page + 1}/{pages})" if pages > 1 else title] = get_page(df, page, per_page)
+    return paged
+
+
+def chart_pages(datasets, per_page=None):
+    return max(page_count(df, per_page) for df in datasets.values()) if per_page else 1
+
+
+def chart_figure(chart_mode, datasets, chart_options, draft=False, page=0, max_labels=None, per_page=None):
+    if chart_mode == HEATMAP_MODE:
+        (title, df), = datasets.items()
+        return render_heatmap(df, title, *chart_options)
+    if chart_mode == COMPARE_MODE:
+        (title, df), = page_of(datasets, page, per_page).items()
+        return render_comparison(df, title, *chart_options)
+    if chart_mode == "Single pillar":
+        (title, df), = datasets.items()
+        return render_page(df, title, page, *chart_options, draft=draft, per_page=per_page or KPIS_PER_PAGE,
+                           max_labels=max_labels)
+    return render_dashboard(page_of(datasets, page, per_page), *chart_options, draft=draft, max_labels=max_labels)
+
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def draft_chart(chart_mode, datasets, chart_options, page=0, max_labels=None, per_page=None):
+    fig = chart_figure(chart_mode, datasets, chart_options, draft=True, page=page, max_labels=max_labels,
+                       per_page=per_page)
+    data = draft_png(fig)
+    plt.close(fig)
+    return data
+
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def export_chart(chart_mode, datasets, chart_options, fmt, dpi=None, compress_level=None, palette_colors=None, page=0,
+                 max_labels=None, per_page=None):
+    if fmt == REPORT_FORMAT:
+        return pdf_report_bytes(
+            fig for title, df in datasets.items() for fig in render_pages(df, title, *chart_options)
+        )
+    if fmt == "WebP":
+        return png_to_webp(export_chart(chart_mode, datasets, chart_options, "PNG", dpi, page=page,
+                                        max_labels=max_labels, per_page=per_page))
+    if fmt == "PNG" and (compress_level is not None or palette_colors):
+        png = export_chart(chart_mode, datasets, chart_options, "PNG", dpi, page=page, max_labels=max_labels,
+                           per_page=per_page)
+        return compress_png(png, 9 if compress_level is None else compress_level, palette_colors)
+    fig = chart_figure(chart_mode, datasets, chart_options, page=page, max_labels=max_labels, per_page=per_page)
+    data = export_figure(fig, EXPORT_FORMATS[fmt][0], dpi)
+    plt.close(fig)
+    return data
+
+
+# Degrade heavy renders to fit the time budget (labels, resolution, then
+# pagination). The preview decides the pages; exports keep them and the
+# resolution the user picked, so only their labels are thinned.
+def budgeted(chart, dpi=None, export=False, per_page=None):
+    chart_mode, datasets, chart_options = chart
+    n_kpis, panels = sum(len(df) for df in datasets.values()), len(datasets)
+    if chart_mode == HEATMAP_MODE:
+        # A heatmap is a single image artist whatever its size
+        return chart, None, dpi, None, [], True
+    if chart_mode == COMPARE_MODE:
+        # Comparisons have no value labels to drop; only pagination applies
+        if render_budget and not export:
+            per_page = paginate_to_budget(n_kpis, LABEL_OPTIONS[0], render_budget, dpi)
+        fits = not render_budget or \
+            estimate_render_seconds(drawn_kpis(n_kpis, 1, per_page), LABEL_OPTIONS[0], dpi) <= render_budget
+        notes = [f"split into pages of {per_page} KPIs"] if per_page and not export else []
+        return chart, None, dpi, per_page, notes, fits
+    if chart_mode == "Single pillar":
+        per_page = per_page or KPIS_PER_PAGE
+    chart_options, max_labels, dpi, per_page, notes, fits = fit_to_budget(
+        n_kpis, chart_options, render_budget, dpi, panels, per_page, lower_dpi=not export, paginate=not export)
+    return (chart_mode, datasets, chart_options), max_labels, dpi, per_page, notes, fits
+
+
+def budget_note(notes, fits):
+    return "; ".join(notes) + (" to stay within the render time budget" if fits
+                               else ", but it is still over the render time budget")
+
+
+# Snapshot history queries; the index length changes on every save
+@st.cache_data(show_spinner="Loading history...", max_entries=16)
+def history_table(pillar, kpis, saved_count):
+    return query_history(pillar, kpis)
+
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def trend_chart(pillar, kpis, saved_count):
+    history = history_table(pillar, kpis, saved_count)
+    if history.empty:
+        return None
+    fig = render_trend(history, f"{pillar} over time")
+    data = export_figure(fig, "png")
+    plt.close(fig)
+    return data
+
+
+def size_note(data, baseline):
+    saved = 1 - len(data) / len(baseline)
+    return f"{format_size(len(data))} ({saved:.0%} smaller than the default PNG, {format_size(len(baseline))})"
+
+
+source = SOURCES[0]
+if mode != "All pillars dashboard":
+    source = st.radio("Data source:", SOURCES, horizontal=True)
+
+# Grouping columns kept from files: periods for the heatmap and comparison, the
+# pillar/objective hierarchy only for the drill-down (other modes chart one row per KPI)
+by_period = mode in (HEATMAP_MODE, COMPARE_MODE)
+by_hierarchy = mode == HIERARCHY_MODE
+
+if source == SOURCES[1]:
+    register = st.file_uploader(
+        "Project register: one row per project with KPI, Status (Green/Amber/Red) and Score columns, "
+        "optionally Project ID" + (" and Period" if by_period else "")
+        + (", Pillar and Objective" if by_hierarchy else ""),
+        type=["csv", "parquet"],
+    )
+    register_df = None
+    if register is not None:
+        try:
+            register_df = aggregate_register(register.getvalue(), register.name.lower().endswith(".parquet"),
+                                             by_period, by_hierarchy)
+            st.caption(f"Aggregated into {len(register_df)} KPI rows.")
+        except Exception as e:
+            st.error(f"Could not read the project register: {e}")
+elif source == SOURCES[2]:
+    # Loaded into the same slot as an aggregated register
+    library = saved_datasets()
+    register_df = None
+    if not library:
+        st.info("No saved datasets yet. Generate a chart, then use Save to dataset library below it.")
     else:
-        return "green"
+        col1, col2 = st.columns(2)
+        saved_name = col1.selectbox("Saved dataset:", list(library))
+        # Grouping columns the mode does not use are dropped, as for uploads
+        register_df = saved_dataset(library[saved_name]).drop(columns=dropped_groups(by_period, by_hierarchy),
+                                                               errors="ignore")
+        # A dataset with several periods is compared with itself (its last two
+        # periods, as for a register); otherwise pick the previous period's dataset
+        if mode == COMPARE_MODE and not ("Period" in register_df and register_df["Period"].nunique() > 1):
+            previous_name = col2.selectbox("Previous period dataset:", list(library), index=min(1, len(library) - 1))
+            previous_df = latest_period(saved_dataset(library[previous_name]).drop(columns=HIERARCHY_COLUMNS,
+                                                                                   errors="ignore"))
+            register_df = latest_period(register_df)
+        st.caption(f"{len(register_df)} KPI rows.")
+        if st.button(f"Delete '{saved_name}'"):
+            delete_dataset(saved_name)
+            st.rerun()
+elif source == SOURCES[3]:
+    # The editor's base table stays fixed and the widget returns it with the edits
+    # applied. Loading new data bumps the widget key, which starts a fresh set of edits.
+    snapshot = st.session_state.get("snapshot")
+    if snapshot and len(snapshot[1]) == 1 and st.button("Load the last generated data into the grid"):
+        st.session_state["grid_base"] = grid_table(next(iter(snapshot[1].values()))).reset_index(drop=True)
+        st.session_state["grid_version"] = st.session_state.get("grid_version", 0) + 1
+    base = st.session_state.setdefault("grid_base", blank_table())
+    grid_key = f"grid:{st.session_state.get('grid_version', 0)}"
+    grid_df = st.data_editor(base, key=grid_key, num_rows="dynamic", hide_index=True, use_container_width=True,
+                             column_config={"Average Score": st.column_config.NumberColumn(
+                                 "Average Score (%)", min_value=0, max_value=100)})
+    # Derived values are only computed (and sent to the browser) when asked for
+    if st.checkbox("Show derived values (totals, shares, score bands)"):
+        st.dataframe(grid_df.join(derive(grid_df)), hide_index=True)
+    register_df = None
+else:
+    st.markdown("### Paste your data below for each column (one item per line):")
+    if mode == "Single pillar":
+        texts = data_inputs()
+    elif mode == HEATMAP_MODE:
+        period_text = st.text_area("Period (e.g. 2024-Q1; one row per KPI per period)", max_chars=MAX_INPUT_CHARS)
+        texts = data_inputs()
+    elif mode == COMPARE_MODE:
+        current_tab, previous_tab = st.tabs(["Current period", "Previous period"])
+        with current_tab:
+            texts = data_inputs("Current")
+        with previous_tab:
+            previous_texts = data_inputs("Previous")
+    elif mode == HIERARCHY_MODE:
+        st.info("Drilling down needs Pillar and Objective columns: upload a file or pick a saved dataset.")
+    else:
+        pillar_texts = {}
+        for title, tab in zip(CHART_TITLES, st.tabs(CHART_TITLES)):
+            with tab:
+                pillar_texts[title] = data_inputs(title)
 
 # Chart rendering
 if st.button("Generate Chart"):
+    st.session_state.pop("chart", None)
+    st.session_state.pop("summaries", None)
+    st.session_state.pop("snapshot", None)
+    st.session_state.pop("quality", None)
+    st.session_state.pop("hierarchy", None)
     try:
-        kpis = [x.strip() for x in kpi_text.strip().split('\n') if x.strip()]
-        avg_scores = [float(x.strip().replace('%', '')) for x in avg_score_text.strip().split('\n') if x.strip()]
-        greens = [int(x.strip()) for x in green_text.strip().split('\n') if x.strip()]
-        ambers = [int(x.strip()) for x in amber_text.strip().split('\n') if x.strip()]
-        reds = [int(x.strip()) for x in red_text.strip().split('\n') if x.strip()]
-
-        if not all(len(lst) == len(kpis) for lst in [avg_scores, greens, ambers, reds]):
-            st.error("All columns must have the same number of entries.")
-        else:
-            df = pd.DataFrame({
-                "KPI": kpis,
-                "Average Score": avg_scores,
-                "Green": greens,
-                "Amber": ambers,
-                "Red": reds
-            })
-
-            fig, ax1 = plt.subplots(figsize=(14, 7))
-
-            if stack_type == "100% stacked (proportional)":
-                df["Total"] = df["Green"] + df["Amber"] + df["Red"]
-                df["Green %"] = df["Green"] / df["Total"] * 100
-                df["Amber %"] = df["Amber"] / df["Total"] * 100
-                df["Red %"] = df["Red"] / df["Total"] * 100
-                y1 = df["Green %"]
-                y2 = df["Amber %"]
-                y3 = df["Red %"]
-                ax1.bar(df["KPI"], y1, label="Number of Projects in Green", color="green")
-                ax1.bar(df["KPI"], y2, bottom=y1, label="Number of Projects in Amber", color="orange")
-                ax1.bar(df["KPI"], y3, bottom=y1 + y2, label="Number of Projects in Red", color="red")
-                ax1.set_ylabel("Proportion (%)")
-                ax1.set_ylim(0, 100)
+        if source == SOURCES[3]:
+            register_df = grid_dataset(grid_df)
+        if source != SOURCES[0]:
+            datasets = None
+            if register_df is None:
+                st.error("Upload a valid project register first." if source == SOURCES[1] else "Pick a saved dataset first.")
+            elif mode == HEATMAP_MODE and "Period" not in register_df:
+                st.error("The project register needs a Period column for the heatmap.")
+            elif mode == COMPARE_MODE and source == SOURCES[2] and "Period" not in register_df:
+                current, previous = register_df, previous_df
+                datasets = {f"{chart_title}: {saved_name} vs {previous_name}": current}
+            elif mode == COMPARE_MODE:
+                # The register's last two periods, in order of appearance
+                periods = register_df["Period"].unique() if "Period" in register_df else []
+                if len(periods) < 2:
+                    st.error("The project register needs a Period column with at least two periods to compare.")
+                else:
+                    current, previous = (register_df[register_df["Period"] == period].drop(columns="Period")
+                                         for period in periods[-1:-3:-1])
+                    datasets = {f"{chart_title}: {periods[-1]} vs {periods[-2]}": current}
             else:
-                y1 = df["Green"]
-                y2 = df["Amber"]
-                y3 = df["Red"]
-                ax1.bar(df["KPI"], y1, label="Number of Projects in Green", color="green")
-                ax1.bar(df["KPI"], y2, bottom=y1, label="Number of Projects in Amber", color="orange")
-                ax1.bar(df["KPI"], y3, bottom=y1 + y2, label="Number of Projects in Red", color="red")
-                ax1.set_ylabel("Number of Projects")
-
-            ax1.tick_params(axis='x', rotation=90)
-
-            # Add labels
-            for i in range(len(df)):
-                green_val = y1[i]
-                amber_val = y2[i]
-                red_val = y3[i]
-                total_val = green_val + amber_val + red_val
-
-                if label_option == "Show total only":
-                    ax1.text(i, total_val + (2 if stack_type == "Raw counts (default)" else 1.5), 
-                             f"{int(total_val)}", ha='center', va='bottom', fontsize=9, fontweight='bold')
-
-                elif label_option == "Show all segment labels":
-                    if green_val > 0:
-                        ax1.text(i, green_val / 2, f"{int(green_val)}", ha='center', va='center', color='white', fontsize=8, fontweight='bold')
-                    if amber_val > 0:
-                        ax1.text(i, green_val + amber_val / 2, f"{int(amber_val)}", ha='center', va='center', color='black', fontsize=8, fontweight='bold')
-                    if red_val > 0:
-                        ax1.text(i, green_val + amber_val + red_val / 2, f"{int(red_val)}", ha='center', va='center', color='white', fontsize=8, fontweight='bold')
-
-            # Score line
-            ax2 = ax1.twinx()
-            ax2.set_ylim(0, 100)
-            ax2.set_ylabel("Average Score (%)")
-            ax2.plot(df["KPI"], df["Average Score"], color="black", linewidth=1)
-
-            if score_line_style == "Colored dots by score":
-                colors = [score_color(score) for score in df["Average Score"]]
-                for i, (x, y, c) in enumerate(zip(df["KPI"], df["Average Score"], colors)):
-                    ax2.plot(i, y, 'o', color=c, markersize=8)
-                dot_legend = [
-                    Line2D([0], [0], marker='o', color='black', label='Avg Score 0–59%', markerfacecolor='red', markersize=8),
-                    Line2D([0], [0], marker='o', color='black', label='Avg Score 60–79%', markerfacecolor='orange', markersize=8),
-                    Line2D([0], [0], marker='o', color='black', label='Avg Score 80–100%', markerfacecolor='green', markersize=8),
-                ]
+                datasets = {chart_title: register_df}
+        elif mode == "Single pillar":
+            df = read_dataset(texts)
+            datasets = {chart_title: df} if df is not None else None
+        elif mode == COMPARE_MODE:
+            current = read_dataset(texts, "current period")
+            previous = read_dataset(previous_texts, "previous period")
+            datasets = {chart_title: current} if current is not None and previous is not None else None
+        elif mode == HEATMAP_MODE:
+            df = read_dataset(texts, period_text=period_text)
+            datasets = {chart_title: df} if df is not None else None
+        elif mode == HIERARCHY_MODE:
+            st.error("Upload a file or pick a saved dataset with Pillar and Objective columns.")
+            datasets = None
+        else:
+            # Pillars left blank are skipped
+            datasets = {}
+            for title, texts in pillar_texts.items():
+                if texts[0].strip():
+                    datasets[title] = read_dataset(texts, title)
+
+            if not datasets:
+                st.error("Paste data for at least one pillar.")
+                datasets = None
+            elif any(df is None for df in datasets.values()):
+                datasets = None
+
+        if datasets:
+            # Data checks run before anything is summarised or rendered
+            checked = dict(datasets)
+            if mode == COMPARE_MODE:
+                checked.update({f"{title} (previous period)": previous for title in datasets})
+            issues = {title: found for title, df in checked.items() if len(found := quality_issues(df))}
+            st.session_state["quality"] = (issues, exclude_flagged)
+            if exclude_flagged and issues:
+                datasets = {title: exclude_issues(df, issues[title]) if title in issues else df
+                            for title, df in datasets.items()}
+                if mode == COMPARE_MODE:
+                    previous_title = f"{next(iter(datasets))} (previous period)"
+                    if previous_title in issues:
+                        previous = exclude_issues(previous, issues[previous_title])
+                if any(df.empty for df in datasets.values()):
+                    st.error("Every row failed the data checks; nothing is left to chart.")
+                    datasets = None
+
+        if datasets:
+            # Summaries and snapshots use every KPI, before Top N folds some into "Others"
+            st.session_state["snapshot"] = (mode, datasets)
+            if mode == HEATMAP_MODE:
+                # Headline numbers are for the latest period: the last heatmap column,
+                # i.e. the last period to appear (rows may be listed KPI by KPI)
+                st.session_state["summaries"] = {
+                    f"{title} ({df['Period'].unique()[-1]})": pillar_summary(latest_period(df))
+                    for title, df in datasets.items()
+                }
             else:
-                dot_legend = []
-
-            ax1.set_title(chart_title.strip() or "KPI Chart", pad=20)
-
-            # Legends
-            bar_handles, bar_labels = ax1.get_legend_handles_labels()
-            if legend_style == "Separate (default)":
-                ax1.legend(bar_handles, bar_labels, loc="upper left")
-                if score_line_style == "Colored dots by score":
-                    ax1.legend(handles=bar_handles + dot_legend, loc="upper right")
-                elif score_line_style == "Black line":
-                    ax2.legend(["Average Score (%)"], loc="upper right")
-                fig.subplots_adjust(top=0.85)
+                st.session_state["summaries"] = {title: pillar_summary(df) for title, df in datasets.items()}
+            if mode == HIERARCHY_MODE:
+                # The chart itself is picked from the tree below, one node at a time
+                st.session_state["hierarchy"] = (KPIHierarchy(next(iter(datasets.values()))), options, sort_by, top_n)
+                st.session_state["prepared_exports"] = set()
             else:
-                all_handles = bar_handles + dot_legend
-                all_labels = bar_labels + [h.get_label() for h in dot_legend]
-                ax1.legend(all_handles, all_labels, loc="lower center", bbox_to_anchor=(0.5, -0.35), ncol=4, frameon=False)
-                fig.subplots_adjust(bottom=0.4)
+                if mode == COMPARE_MODE:
+                    datasets = {title: compare_datasets(df, previous) for title, df in datasets.items()}
+                elif mode != HEATMAP_MODE:
+                    datasets = {title: arrange_kpis(df, sort_by, top_n) for title, df in datasets.items()}
+                st.session_state["chart"] = (mode, datasets, options)
+                st.session_state["prepared_exports"] = set()
+
+    except Exception as e:
+        st.error(f"An error occurred: {e}")
+
+if st.session_state.get("quality", ({}, False))[0]:
+    issues, excluded = st.session_state["quality"]
+    table = pd.concat([found.assign(Dataset=title) for title, found in issues.items()], ignore_index=True)
+    rows = sum(found["Row"].nunique() for found in issues.values())
+    st.warning(f"{len(table)} data-quality issue(s) in {rows} row(s)"
+               + (", left out of the chart." if excluded else ". Tick the data checks option to leave them out."))
+    with st.expander("Data-quality issues"):
+        columns = ["Dataset", "Row", "KPI", "Issue"] if len(issues) > 1 else ["Row", "KPI", "Issue"]
+        st.dataframe(table[columns], hide_index=True)
+
+# Headline numbers are shown before (and independently of) the chart render
+if "summaries" in st.session_state:
+    summaries = st.session_state["summaries"]
+    with st.expander("Summary", expanded=True):
+        if len(summaries) == 1:
+            summary = next(iter(summaries.values()))
+            cols = st.columns(5)
+            cols[0].metric("Projects", summary["projects"])
+            for col, (status, count) in zip(cols[1:4], summary["counts"].items()):
+                col.metric(status, count, f"{count / max(summary['projects'], 1):.0%}", delta_color="off")
+            cols[4].metric("Weighted avg score", f"{summary['weighted_score']:.1f}%")
+            st.caption("KPIs by score band: " + ", ".join(
+                f"{label} {share:.0%}" for label, share in summary["band_share"].items()))
+            st.markdown("**Worst-performing KPIs**")
+            st.dataframe(summary["worst"], hide_index=True)
+        else:
+            st.dataframe(summary_table(summaries), hide_index=True)
+            worst = pd.concat([s["worst"].assign(Pillar=title) for title, s in summaries.items()])
+            st.markdown("**Worst-performing KPIs**")
+            st.dataframe(worst.sort_values("Average Score", kind="stable").head(10)[
+                ["Pillar", "KPI", "Average Score", "Red share"]], hide_index=True)
+
+# Drill-down: chart the children of the selected node (pillars, a pillar's
+# objectives, or an objective's KPIs). Node aggregates live in the tree, so
+# switching levels or editing a KPI re-renders without re-reading any data.
+if "hierarchy" in st.session_state:
+    tree, tree_options, tree_sort_by, tree_top_n = st.session_state["hierarchy"]
+    col1, col2 = st.columns(2)
+    path = ()
+    drill_pillar = col1.selectbox("Drill into pillar:", ["All pillars"] + [p[-1] for p in tree.children[()]])
+    if drill_pillar != "All pillars":
+        path = (drill_pillar,)
+        drill_objective = col2.selectbox("Drill into objective:",
+                                         ["All objectives"] + [p[-1] for p in tree.children[path]])
+        if drill_objective != "All objectives":
+            path = (drill_pillar, drill_objective)
+
+    with st.expander("Edit a KPI"):
+        leaves = {" › ".join(path): path for path in tree.kpis()}
+        leaf = st.selectbox("KPI:", list(leaves))
+        green, amber, red = tree.stats[leaves[leaf]][:3]
+        score = tree.score(leaves[leaf])
+        cols = st.columns(4)
+        # Left empty for a KPI without a score
+        new_score = cols[0].number_input("Average Score (%)", 0.0, 100.0, None if np.isnan(score) else float(score),
+                                         key=f"edit:{leaf}:score")
+        new_counts = [col.number_input(status, 0, value=int(count), key=f"edit:{leaf}:{status}")
+                      for col, status, count in zip(cols[1:], ["Green", "Amber", "Red"], [green, amber, red])]
+        if st.button("Update KPI"):
+            # Only the KPI's objective, pillar and the root are adjusted
+            tree.update_kpi(leaves[leaf], new_score, *new_counts)
+
+    node_title = " › ".join(path) or "All pillars"
+    st.session_state["chart"] = (
+        "Single pillar", {node_title: arrange_kpis(tree.node_table(path), tree_sort_by, tree_top_n)}, tree_options
+    )
+
+if "chart" in st.session_state:
+    chart = st.session_state["chart"]
+    try:
+        chart_mode, datasets, chart_options = chart
+        backend = DISPLAY_BACKENDS[0]
+        if chart_mode not in (HEATMAP_MODE, COMPARE_MODE):
+            backend = st.radio("Display:", DISPLAY_BACKENDS, horizontal=True)
+
+        # Long charts are split into pages (single pillars always, dashboards and
+        # comparisons when over the render budget); only the visible page is rendered
+        view, max_labels, view_dpi, per_page, notes, fits = budgeted(chart)
+        page, pages = 0, chart_pages(datasets, per_page)
+        if pages > 1:
+            page = st.number_input(f"Page (of {pages}):", min_value=1, max_value=pages, value=1) - 1
+
+        # Interactive charts are drawn client-side; exports below still use matplotlib
+        if backend == DISPLAY_BACKENDS[1]:
+            for title, df in datasets.items():
+                ymax = None
+                panel_pages = page_count(df, per_page) if per_page else 1
+                if page >= panel_pages:
+                    continue
+                if panel_pages > 1:
+                    title = f"{title} ({page + 1}/{panel_pages})"
+                    ymax = shared_ymax(df, chart_options[2])
+                    df = get_page(df, page, per_page)
+                st.vega_lite_chart(chart_spec(df, title, *chart_options, ymax=ymax), use_container_width=True)
+        else:
+            # Smaller previews for slow connections
+            col1, col2 = st.columns(2)
+            preview_quality = col1.radio("Preview quality:", PREVIEW_QUALITIES)
+            preview_format = col2.radio("Preview image:", PREVIEW_FORMATS)
+
+            if notes:
+                st.info(f"Large chart: {budget_note(notes, fits)}.")
 
-            st.pyplot(fig)
+            # The draft is sent first and replaced in place once the full render is ready
+            paging = {"page": page, "max_labels": max_labels, "per_page": per_page}
+            preview_slot = st.empty()
+            if preview_quality != "Full quality":
+                preview_slot.image(draft_chart(*view, **paging))
+            if preview_quality != "Draft only (full quality on export)":
+                baseline = export_chart(*view, "PNG", view_dpi, **paging)
+                if preview_format == "WebP":
+                    preview = export_chart(*view, "WebP", view_dpi, **paging)
+                elif preview_format == "Optimized PNG (palette)":
+                    preview = export_chart(*view, "PNG", view_dpi, 9, PALETTE_COLORS, **paging)
+                else:
+                    preview = baseline
+                preview_slot.image(preview)
+                if preview_format != "PNG":
+                    st.caption(f"Preview size: {size_note(preview, baseline)}")
 
-            # Download button
-            buf = io.BytesIO()
-            fig.savefig(buf, format="png", bbox_inches="tight")
+        if chart_mode == COMPARE_MODE:
+            st.dataframe(next(iter(datasets.values())), hide_index=True)
+
+        # Downloads are only encoded once asked for
+        # Reports are paginated bar charts, so only offered for those
+        formats = list(EXPORT_FORMATS)
+        if chart_mode == "All pillars dashboard" or (chart_mode == "Single pillar" and pages > 1):
+            formats.append(REPORT_FORMAT)
+        col1, col2, col3, col4 = st.columns(4)
+        export_format = col1.selectbox("Export format:", formats)
+        dpi = compress_level = palette_colors = None
+        if export_format == "PNG":
+            dpi = col2.selectbox("PNG resolution (DPI):", PNG_DPIS)
+            compress_level = col3.slider("PNG compression level:", 0, 9, 6)
+            if col4.checkbox("Palette (indexed colour)"):
+                palette_colors = PALETTE_COLORS
+        export_key = (export_format, dpi, compress_level, palette_colors)
+
+        prepared = st.session_state.setdefault("prepared_exports", set())
+        if (export_key, page) not in prepared and st.button("Prepare download"):
+            prepared.add((export_key, page))
+
+        if (export_key, page) in prepared:
+            ext, mime = EXPORT_FORMATS.get(export_format, ("pdf", "application/pdf"))
+            name = {"All pillars dashboard": "kpi_dashboard", HEATMAP_MODE: "kpi_heatmap",
+                    COMPARE_MODE: "kpi_comparison"}.get(chart_mode, "kpi_chart")
+            if export_format == REPORT_FORMAT:
+                name = "kpi_report"
+            elif pages > 1:
+                name = f"{name}_page{page + 1}"
+            if export_format == REPORT_FORMAT:
+                # Report pages are already bounded by pagination
+                view, max_labels, notes, fits = chart, None, [], True
+            else:
+                view, max_labels, dpi, per_page, notes, fits = budgeted(chart, dpi, export=True, per_page=per_page)
+            paging = {"page": page, "max_labels": max_labels, "per_page": per_page}
+            data = export_chart(*view, export_format, dpi, compress_level, palette_colors, **paging)
             st.download_button(
-                label="📥 Download Chart as PNG",
-                data=buf.getvalue(),
-                file_name="kpi_chart.png",
-                mime="image/png"
+                label=f"📥 Download Chart as {ext.upper()}",
+                data=data,
+                file_name=f"{name}.{ext}",
+                mime=mime
             )
+            if notes:
+                st.caption(f"Export degraded: {budget_note(notes, fits)}.")
+            elif not fits:
+                st.caption("This export is over the render time budget.")
+            if export_format == "PNG":
+                baseline = export_chart(*view, "PNG", dpi, **paging)
+                st.caption(f"File size: {size_note(data, baseline)}")
 
     except Exception as e:
         st.error(f"An error occurred: {e}")
+
+# Snapshot history
+if "snapshot" in st.session_state:
+    snapshot_mode, snapshot_datasets = st.session_state["snapshot"]
+    with st.expander("Save to history"):
+        if snapshot_mode == HEATMAP_MODE:
+            st.caption("Each period in the data is saved as its own snapshot.")
+            period = None
+        else:
+            period = st.text_input("Period:", current_period())
+        if st.button("Save snapshot"):
+            try:
+                for title, df in snapshot_datasets.items():
+                    if period is None:
+                        for data_period, rows in df.groupby("Period", sort=False):
+                            save_snapshot(rows, title, data_period)
+                    else:
+                        save_snapshot(df, title, period)
+                st.success("Snapshot saved.")
+            except Exception as e:
+                st.error(f"Could not save the snapshot: {e}")
+
+    with st.expander("Save to dataset library"):
+        dataset_name = st.text_input("Dataset name:")
+        if st.button("Save dataset"):
+            try:
+                for title, df in snapshot_datasets.items():
+                    save_dataset(df, dataset_name if len(snapshot_datasets) == 1 else f"{dataset_name} ({title})")
+                st.success("Dataset saved. Reload it any time with the Saved dataset source.")
+            except Exception as e:
+                st.error(f"Could not save the dataset: {e}")
+
+saved = load_index()
+if saved:
+    with st.expander("History and trends"):
+        col1, col2 = st.columns(2)
+        pillar = col1.selectbox("Pillar:", history_pillars())
+        kpi_names = history_table(pillar, (), len(saved))["KPI"].unique().tolist()
+        kpis = col2.multiselect("KPIs (none = whole pillar):", kpi_names)
+        try:
+            trend = trend_chart(pillar, tuple(kpis), len(saved))
+            if trend is None:
+                st.info("No snapshots saved for this pillar yet.")
+            else:
+                st.image(trend)
+        except Exception as e:
+            st.error(f"Could not load the history: {e}")
@@ -0,0 +1,107 @@
+import json
+import math
+import sys
+import time
+
+import matplotlib.pyplot as plt
+
+from kpi_chart import build_dataframe, render_chart, export_figure
+from vega_chart import chart_spec
+
+try:
+    import vl_convert
+except ImportError:  # optional: enables static SVG/PNG/PDF output from the Vega-Lite backend
+    vl_convert = None
+
+BENCHMARK_SIZES = [10, 50, 250]
+
+
+# Rendering backends. Each one turns the same chart spec (dataset, title and the
+# four display options) into encoded bytes for the formats it supports.
+class MatplotlibBackend:
+    name = "matplotlib"
+    formats = ("png", "svg", "pdf")
+
+    def render(self, df, chart_title, options, fmt="png", dpi=None):
+        fig = render_chart(df, chart_title, *options)
+        data = export_figure(fig, fmt, dpi)
+        plt.close(fig)
+        return data
+
+
+class VegaLiteBackend:
+    name = "vega-lite"
+    formats = ("json", "png", "svg", "pdf") if vl_convert else ("json",)
+
+    def render(self, df, chart_title, options, fmt="json", dpi=None):
+        spec = chart_spec(df, chart_title, *options)
+        if fmt == "json":
+            return json.dumps(spec).encode()
+        # Static output has no container to size against; match the matplotlib figure width
+        spec["width"] = 1200
+        if fmt == "svg":
+            return vl_convert.vegalite_to_svg(spec).encode()
+        if fmt == "png":
+            return vl_convert.vegalite_to_png(spec, scale=(dpi or 100) / 100)
+        return vl_convert.vegalite_to_pdf(spec)
+
+
+BACKENDS = {backend.name: backend for backend in [MatplotlibBackend(), VegaLiteBackend()]}
+
+
+def backends_for(fmt):
+    return [backend for backend in BACKENDS.values() if fmt in backend.formats]
+
+
+# Benchmarking and selection
+def sample_dataset(size):
+    return build_dataframe(
+        [f"Sample KPI {i}" for i in range(size)],
+        [(i * 37) % 101 for i in range(size)],
+        [(i * 7) % 11 for i in range(size)],
+        [(i * 5) % 7 for i in range(size)],
+        [(i * 3) % 5 for i in range(size)],
+    )
+
+
+def benchmark(fmt="png", sizes=BENCHMARK_SIZES, options=(), repeat=1):
+    # {size: {backend name: best time in seconds}}
+    results = {}
+    # Warm up first so one-off start-up costs (fonts, JS engine) are not billed to the first size
+    for backend in backends_for(fmt):
+        backend.render(sample_dataset(1), "Benchmark", options, fmt)
+    for size in sizes:
+        df = sample_dataset(size)
+        results[size] = {}
+        for backend in backends_for(fmt):
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                backend.render(df, "Benchmark", options, fmt)
+                timings.append(time.perf_counter() - start)
+            results[size][backend.name] = min(timings)
+    return results
+
+
+def fastest_backend(size, fmt, results):
+    candidates = backends_for(fmt)
+    if len(candidates) == 1 or not results:
+        return candidates[0]
+    # Use the benchmarked size closest to this dataset (by ratio, as cost grows with size)
+    nearest = min(results, key=lambda benchmarked: abs(math.log(max(size, 1) / benchmarked)))
+    timings = results[nearest]
+    return min(candidates, key=lambda backend: timings.get(backend.name, float("inf")))
+
+
+def main(argv=None):
+    formats = (argv if argv is not None else sys.argv[1:]) or ["png", "svg"]
+    for fmt in formats:
+        results = benchmark(fmt)
+        print(f"{fmt}:")
+        for size, timings in results.items():
+            cells = ", ".join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in timings.items())
+            print(f"  {size:>5} KPIs: {cells} -> {fastest_backend(size, fmt, results).name}")
+
+
+if __name__ == "__main__":
+    main()
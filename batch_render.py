@@ -0,0 +1,201 @@
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import matplotlib
+
+matplotlib.use("Agg")
+
+import matplotlib.pyplot as plt
+
+from kpi_chart import (
+    CHART_TITLES, LEGEND_STYLES, SCORE_LINE_STYLES, STACK_TYPES, LABEL_OPTIONS,
+    SORT_OPTIONS, render_chart, render_page, page_count, arrange_kpis,
+)
+from aggregate import read_kpi_file
+from report import write_pdf_report
+from backends import BACKENDS, benchmark, fastest_backend
+
+STATE_FILE = ".rendered.json"
+OPTION_NAMES = ["legend_style", "score_line_style", "stack_type", "label_option"]
+ARRANGE_NAMES = ["sort_by", "top_n"]
+INPUT_SUFFIXES = (".csv", ".parquet")
+
+
+# Job discovery
+def title_for(path):
+    stem = path.stem.replace("_", " ").replace("-", " ").lower()
+    for title in CHART_TITLES:
+        if title.lower().startswith(stem) or stem.startswith(title.lower()):
+            return title
+    return "KPI Chart"
+
+
+def jobs_from_directory(root, out_dir, fmt, options):
+    jobs = []
+    for path in sorted(p for p in root.rglob("*") if p.suffix in INPUT_SUFFIXES):
+        rel = path.relative_to(root).with_suffix(f".{fmt}")
+        jobs.append({"input": str(path), "output": str(out_dir / rel), "title": title_for(path), **options})
+    return jobs
+
+
+def jobs_from_manifest(manifest, out_dir, fmt, options):
+    base = manifest.parent
+    jobs = []
+    for entry in json.loads(manifest.read_text()):
+        path = base / entry["input"]
+        output = entry.get("output") or Path(entry["input"]).with_suffix(f".{fmt}")
+        job = {"input": str(path), "output": str(out_dir / output), "title": entry.get("title") or title_for(path)}
+        job.update({name: entry.get(name, options[name]) for name in OPTION_NAMES + ARRANGE_NAMES})
+        jobs.append(job)
+    return jobs
+
+
+def job_key(job):
+    digest = hashlib.sha256(Path(job["input"]).read_bytes())
+    # The backend is left out: the same chart from another backend is still up to date
+    options = {k: v for k, v in job.items() if k not in ("input", "output", "backend")}
+    digest.update(json.dumps(options, sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+def load_job(job):
+    # Inputs may be per-KPI summaries or raw project registers (aggregated in chunks)
+    df = read_kpi_file(job["input"], job["input"].endswith(".parquet"), by_period=False)
+    return arrange_kpis(df, *(job[name] for name in ARRANGE_NAMES))
+
+
+# Rendering (runs in worker processes)
+def render_job(job, benchmarks=None):
+    # With benchmarks ("auto"), the backend is picked here by the number of KPI
+    # bars drawn (registers hold one row per project) and the output format
+    df = load_job(job)
+    options = [job[name] for name in OPTION_NAMES]
+    output = Path(job["output"])
+    output.parent.mkdir(parents=True, exist_ok=True)
+    backend = job.get("backend", "matplotlib")
+    if benchmarks:
+        fmt = output.suffix.lstrip(".")
+        backend = fastest_backend(len(df), fmt, benchmarks[fmt]).name
+    if backend == "matplotlib":
+        fig = render_chart(df, job["title"], *options)
+        fig.savefig(output, bbox_inches="tight")
+        plt.close(fig)
+    else:
+        output.write_bytes(BACKENDS[backend].render(df, job["title"], options, output.suffix.lstrip(".")))
+    return job["output"]
+
+
+# Resumable state
+def state_name(job, out_dir):
+    return Path(os.path.relpath(job["output"], out_dir)).as_posix()
+
+
+def load_state(out_dir):
+    state_path = out_dir / STATE_FILE
+    if state_path.exists():
+        return json.loads(state_path.read_text())
+    return {}
+
+
+def save_state(out_dir, state):
+    state_path = out_dir / STATE_FILE
+    tmp_path = state_path.with_suffix(".tmp")
+    tmp_path.write_text(json.dumps(state, indent=2, sort_keys=True))
+    os.replace(tmp_path, state_path)
+
+
+def run(jobs, out_dir, workers=None, force=False, auto_backend=False):
+    out_dir.mkdir(parents=True, exist_ok=True)
+    state = {} if force else load_state(out_dir)
+
+    pending = []
+    for job in jobs:
+        key = job_key(job)
+        if state.get(state_name(job, out_dir)) == key and Path(job["output"]).exists():
+            continue
+        pending.append((job, key))
+
+    print(f"{len(jobs) - len(pending)} up to date, {len(pending)} to render")
+    benchmarks = None
+    if auto_backend and pending:
+        # Benchmarked once per output format, and only when there is something to render
+        benchmarks = {fmt: benchmark(fmt) for fmt in {Path(job["output"]).suffix.lstrip(".") for job, _ in pending}}
+    failures = 0
+    # Spawned rather than forked workers: pyarrow's background threads do not survive a fork
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = {pool.submit(render_job, job, benchmarks): (job, key) for job, key in pending}
+        for future in as_completed(futures):
+            job, key = futures[future]
+            try:
+                future.result()
+            except Exception as e:
+                failures += 1
+                print(f"FAILED {job['input']}: {e}", file=sys.stderr)
+                continue
+            state[state_name(job, out_dir)] = key
+            save_state(out_dir, state)
+            print(f"rendered {job['output']}")
+    return failures
+
+
+def report_figures(jobs, failed):
+    # Jobs that fail to load or render are reported, added to `failed` and left out of the report
+    for job in jobs:
+        try:
+            df = load_job(job)
+            options = [job[name] for name in OPTION_NAMES]
+            for page in range(page_count(df)):
+                yield render_page(df, job["title"], page, *options)
+        except Exception as e:
+            failed.append(job)
+            print(f"FAILED {job['input']}: {e}", file=sys.stderr)
+
+
+def run_report(jobs, report_path):
+    # Sequential on purpose: pages are streamed into one file in order
+    failed = []
+    count = write_pdf_report(report_figures(jobs, failed), report_path)
+    print(f"wrote {count} pages to {report_path}" + (f", {len(failed)} failed" if failed else ""))
+    return 1 if failed else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render KPI charts for many datasets without the Streamlit UI.")
+    parser.add_argument("source", type=Path, help="directory of KPI CSV or Parquet files, or a JSON manifest")
+    parser.add_argument("-o", "--out", type=Path, default=Path("charts"), help="output directory")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="number of worker processes")
+    parser.add_argument("--format", default="png", choices=["png", "svg", "pdf"])
+    parser.add_argument("--backend", default="matplotlib", choices=["auto"] + list(BACKENDS),
+                        help="rendering backend; 'auto' benchmarks them and picks the fastest per dataset size")
+    parser.add_argument("--report", type=Path, help="write every chart into this multi-page PDF instead")
+    parser.add_argument("--force", action="store_true", help="re-render everything, ignoring the saved state")
+    parser.add_argument("--legend-style", default=LEGEND_STYLES[0], choices=LEGEND_STYLES)
+    parser.add_argument("--score-line-style", default=SCORE_LINE_STYLES[0], choices=SCORE_LINE_STYLES)
+    parser.add_argument("--stack-type", default=STACK_TYPES[0], choices=STACK_TYPES)
+    parser.add_argument("--label-option", default=LABEL_OPTIONS[0], choices=LABEL_OPTIONS)
+    parser.add_argument("--sort-by", default=SORT_OPTIONS[0], choices=SORT_OPTIONS)
+    parser.add_argument("--top-n", type=int, default=0, help="keep the first N KPIs and group the rest as Others")
+    args = parser.parse_args(argv)
+
+    options = {name: getattr(args, name) for name in OPTION_NAMES + ARRANGE_NAMES}
+    if args.source.is_dir():
+        jobs = jobs_from_directory(args.source, args.out, args.format, options)
+    else:
+        jobs = jobs_from_manifest(args.source, args.out, args.format, options)
+
+    if args.report:
+        return run_report(jobs, args.report)
+    if args.backend != "auto":
+        for job in jobs:
+            job["backend"] = args.backend
+    return 1 if run(jobs, args.out, args.workers, args.force, args.backend == "auto") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
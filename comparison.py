@@ -0,0 +1,104 @@
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+from matplotlib.lines import Line2D
+from matplotlib.patches import Patch
+
+from kpi_chart import STATUSES, figure_size
+
+COMPARISON_VIEWS = ["Grouped bars (previous vs current)", "Change in counts"]
+COMPARED_COLUMNS = ["Average Score", "Green", "Amber", "Red"]
+MOVEMENT_COLORS = {1: "green", 0: "grey", -1: "red"}
+
+
+# Period-over-period table: one row per KPI, current values under the usual
+# column names, the previous period's under "Previous ..." and the change under
+# "Change in ...". KPIs present in only one period get zero counts on the other
+# side and no score change.
+def compare_datasets(current, previous):
+    for name, df in [("current", current), ("previous", previous)]:
+        repeated = df["KPI"][df["KPI"].duplicated()]
+        if len(repeated):
+            raise ValueError(f"KPI '{repeated.iloc[0]}' appears more than once in the {name} period")
+
+    # Hash join on the KPI name; current order first, then KPIs that were dropped
+    merged = pd.merge(current[["KPI"] + COMPARED_COLUMNS], previous[["KPI"] + COMPARED_COLUMNS],
+                      on="KPI", how="outer", sort=False, suffixes=("", " (previous)"), indicator=True)
+    comparison = pd.DataFrame({"KPI": merged["KPI"]})
+    for column in COMPARED_COLUMNS:
+        now, before = merged[column], merged[f"{column} (previous)"]
+        if column != "Average Score":
+            now, before = now.fillna(0).astype(int), before.fillna(0).astype(int)
+        change = now - before
+        if column == "Average Score":
+            # Scores are float32; round away the representation error (12.4, not 12.399994)
+            change = change.astype(float).round(2)
+        comparison[column] = now
+        comparison[f"Previous {column}"] = before
+        comparison[f"Change in {column}"] = change
+    comparison["Present in"] = merged["_merge"].map({"both": "Both", "left_only": "Current", "right_only": "Previous"})
+    return comparison.reset_index(drop=True)
+
+
+def movement(change):
+    return np.sign(change.fillna(0).round(1)).astype(int)
+
+
+def render_comparison(comparison, chart_title, view=COMPARISON_VIEWS[0]):
+    n = len(comparison)
+    x = np.arange(n)
+    fig, ax1 = plt.subplots(figsize=figure_size(comparison))
+
+    if view == COMPARISON_VIEWS[0]:
+        # Previous period as a faded stack on the left, current as a solid stack on the right
+        width = 0.38
+        for offset, prefix, alpha in [(-width / 2, "Previous ", 0.4), (width / 2, "", 1.0)]:
+            bottom = np.zeros(n)
+            for column, color, _, _ in STATUSES:
+                values = comparison[prefix + column].to_numpy()
+                ax1.bar(x + offset, values, width, bottom=bottom, color=color, alpha=alpha)
+                bottom += values
+        ax1.set_ylabel("Number of Projects")
+        score_from, score_to = x - width / 2, x + width / 2
+        bar_legend = [Patch(color=color, label=column) for column, color, _, _ in STATUSES] + [
+            Patch(facecolor="grey", alpha=0.4, label="Previous period"),
+            Patch(facecolor="grey", label="Current period"),
+        ]
+    else:
+        width = 0.27
+        for i, (column, color, _, _) in enumerate(STATUSES):
+            ax1.bar(x + (i - 1) * width, comparison[f"Change in {column}"], width, color=color)
+        ax1.axhline(0, color="black", linewidth=0.8)
+        ax1.set_ylabel("Change in Number of Projects")
+        score_from = score_to = x
+        bar_legend = [Patch(color=color, label=f"Change in {column}") for column, color, _, _ in STATUSES]
+
+    ax1.set_xticks(x)
+    ax1.set_xticklabels(comparison["KPI"], rotation=90)
+    ax1.set_xlim(-0.6, n - 0.4)
+
+    # Score movement: one arrow per KPI from last period's score to this period's,
+    # drawn as a single quiver artist
+    ax2 = ax1.twinx()
+    ax2.set_ylim(0, 100)
+    ax2.set_ylabel("Average Score (%)")
+    both = comparison["Average Score"].notna() & comparison["Previous Average Score"].notna()
+    direction = movement(comparison["Change in Average Score"])
+    if both.any():
+        ax2.quiver(score_from[both], comparison["Previous Average Score"][both],
+                   (score_to - score_from)[both], comparison["Change in Average Score"][both],
+                   color=[MOVEMENT_COLORS[d] for d in direction[both]],
+                   angles="xy", scale_units="xy", scale=1, width=0.003, headwidth=4, headlength=4)
+    ax2.scatter(score_to, comparison["Average Score"], color=[MOVEMENT_COLORS[d] for d in direction],
+                edgecolors="black", zorder=3, s=30)
+
+    score_legend = [
+        Line2D([0], [0], marker=r"$\uparrow$", linestyle="", color="green", markersize=10, label="Score up"),
+        Line2D([0], [0], marker=r"$\downarrow$", linestyle="", color="red", markersize=10, label="Score down"),
+        Line2D([0], [0], marker="o", linestyle="", color="grey", label="Score unchanged or new"),
+    ]
+    ax1.legend(handles=bar_legend + score_legend, loc="lower center", bbox_to_anchor=(0.5, -0.45), ncol=4,
+               frameon=False)
+    ax1.set_title(chart_title.strip() or "KPI Comparison", pad=20)
+    fig.subplots_adjust(bottom=0.4)
+    return fig
@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+
+from kpi_chart import SCORE_BANDS, build_dataframe
+
+INPUT_COLUMNS = ["KPI", "Average Score", "Green", "Amber", "Red"]
+BLANK_ROWS = 5
+
+
+# Spreadsheet-style input. st.data_editor keeps its edits as row-level deltas
+# against a fixed base table and returns the edited table; derived values
+# (totals, shares, score bands) are a vectorized pass over it, done on demand.
+def grid_table(df):
+    # Plain column types for the editor (a categorical KPI column would only offer existing names)
+    return df[INPUT_COLUMNS].astype({"KPI": str, "Average Score": float, "Green": int, "Amber": int, "Red": int})
+
+
+def blank_table(rows=BLANK_ROWS):
+    return pd.DataFrame({
+        "KPI": pd.Series([""] * rows, dtype=str),
+        "Average Score": pd.Series([np.nan] * rows, dtype=float),
+        **{column: pd.Series([0] * rows, dtype=int) for column in ["Green", "Amber", "Red"]},
+    })
+
+
+def derive(df):
+    counts = df[["Green", "Amber", "Red"]].apply(pd.to_numeric, errors="coerce").fillna(0)
+    total = counts.sum(axis=1)
+    derived = pd.DataFrame({"Total": total.astype(int)}, index=df.index)
+    for column in ["Green", "Amber", "Red"]:
+        derived[f"{column} %"] = (counts[column] / total.where(total > 0) * 100).round(1)
+    scores = pd.to_numeric(df["Average Score"], errors="coerce")
+    bands = np.searchsorted([upper for upper, _, _ in SCORE_BANDS[:-1]], scores.fillna(0).to_numpy(), side="right")
+    derived["Score Band"] = np.where(scores.isna(), "", np.array([label for _, _, label in SCORE_BANDS])[bands])
+    derived["Total Label"] = derived["Total"].astype(str)
+    return derived
+
+
+def grid_dataset(df):
+    # Rows without a KPI name are ignored; empty counts are zero
+    df = df[df["KPI"].fillna("").astype(str).str.strip() != ""]
+    if df.empty:
+        raise ValueError("Enter at least one KPI in the grid")
+    missing = df["KPI"][pd.to_numeric(df["Average Score"], errors="coerce").isna()]
+    if len(missing):
+        raise ValueError(f"Missing average score for KPI '{missing.iloc[0]}'")
+    counts = df[["Green", "Amber", "Red"]].apply(pd.to_numeric, errors="coerce").fillna(0).astype(int)
+    return build_dataframe(
+        df["KPI"].astype(str).str.strip().tolist(),
+        pd.to_numeric(df["Average Score"]).tolist(),
+        counts["Green"].tolist(),
+        counts["Amber"].tolist(),
+        counts["Red"].tolist(),
+    )
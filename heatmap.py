@@ -0,0 +1,61 @@
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+from matplotlib.colors import BoundaryNorm, ListedColormap
+from matplotlib.patches import Patch
+
+from kpi_chart import SCORE_BANDS, STATUSES
+
+HEATMAP_METRICS = ["Average score", "Green share", "Amber share", "Red share"]
+HEATMAP_MAX_LABELS = 60
+
+
+# KPI x period matrix. Rows and columns keep the order in which KPIs and periods
+# first appear; a KPI repeated within a period is averaged.
+def heatmap_matrix(df, metric=HEATMAP_METRICS[0]):
+    if metric == "Average score":
+        values = df["Average Score"].astype(float)
+    else:
+        column = metric.split()[0]
+        totals = df["Green"] + df["Amber"] + df["Red"]
+        values = df[column] / totals.where(totals > 0) * 100
+    table = pd.DataFrame({"KPI": df["KPI"], "Period": df["Period"].astype(str), "Value": values})
+    matrix = table.pivot_table(index="KPI", columns="Period", values="Value", aggfunc="mean", sort=False,
+                               observed=True)
+    return matrix.reindex(index=table["KPI"].unique(), columns=table["Period"].unique())
+
+
+def render_heatmap(df, chart_title, metric=HEATMAP_METRICS[0]):
+    matrix = heatmap_matrix(df, metric)
+    n_kpis, n_periods = matrix.shape
+    fig, ax = plt.subplots(figsize=(min(max(8, 0.6 * n_periods + 5), 30), min(max(6, 0.15 * n_kpis + 2), 30)))
+
+    if metric == "Average score":
+        # Same bands as the score dots on the bar chart
+        cmap = ListedColormap([color for _, color, _ in SCORE_BANDS])
+        norm = BoundaryNorm([0] + [upper for upper, _, _ in SCORE_BANDS[:-1]] + [100], cmap.N, clip=True)
+    else:
+        color = next(color for column, color, _, _ in STATUSES if metric.startswith(column))
+        cmap = ListedColormap(plt.get_cmap({"green": "Greens", "orange": "Oranges", "red": "Reds"}[color])(np.linspace(0.05, 1, 256)))
+        norm = plt.Normalize(0, 100)
+    cmap.set_bad("lightgrey")
+
+    # The whole matrix is one image artist, so cost barely depends on the number of cells
+    image = ax.imshow(np.ma.masked_invalid(matrix.to_numpy(dtype=float)), cmap=cmap, norm=norm,
+                      aspect="auto", interpolation="nearest")
+
+    step = max(1, -(-n_kpis // HEATMAP_MAX_LABELS))
+    ax.set_yticks(range(0, n_kpis, step))
+    ax.set_yticklabels(matrix.index[::step])
+    ax.set_xticks(range(n_periods))
+    ax.set_xticklabels(matrix.columns, rotation=90)
+    ax.set_xlabel("Period")
+    ax.set_title(chart_title.strip() or "KPI Chart", pad=20)
+
+    if metric == "Average score":
+        ax.legend(handles=[Patch(color=color, label=label) for _, color, label in SCORE_BANDS]
+                  + [Patch(color="lightgrey", label="No data")],
+                  loc="upper left", bbox_to_anchor=(1.01, 1), frameon=False)
+    else:
+        fig.colorbar(image, ax=ax, label=f"{metric} of projects (%)", fraction=0.03)
+    return fig
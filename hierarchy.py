@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+
+from kpi_chart import build_dataframe
+
+LEVELS = ["Pillar", "Objective", "KPI"]
+# Additive per-node statistics: RAG counts, project-weighted score numerator and
+# its denominator, plain score sum and KPI count (for nodes without any projects).
+# Unscored KPIs count towards the RAG counts only, as in the pillar summary.
+STAT_COLUMNS = ["Green", "Amber", "Red", "Weighted Score", "Scored Projects", "Score Sum", "Scored KPIs"]
+
+
+def leaf_stats(green, amber, red, score):
+    # Works on scalars (one KPI) and on columns (a whole table)
+    scored = pd.notna(score)
+    totals = green + amber + red
+    return {
+        "Green": green, "Amber": amber, "Red": red,
+        "Weighted Score": np.where(scored, score * totals, 0), "Scored Projects": np.where(scored, totals, 0),
+        "Score Sum": np.where(scored, score, 0), "Scored KPIs": np.where(scored, 1, 0),
+    }
+
+
+# Pillar -> objective -> KPI tree. Nodes are identified by their path, e.g.
+# ("Economy",) or ("Economy", "Jobs", "Unemployment rate"); the root is ().
+# Every node keeps the sum of its KPIs' statistics, built bottom-up once.
+# Because the statistics are additive, editing a KPI only adjusts the nodes on
+# its path to the root.
+class KPIHierarchy:
+    def __init__(self, df):
+        missing = [level for level in LEVELS if level not in df]
+        if missing:
+            raise ValueError(f"Missing column '{missing[0]}'")
+        df = df.reset_index(drop=True).astype({level: str for level in LEVELS})
+        repeated = df[df.duplicated(LEVELS)]
+        if len(repeated):
+            raise ValueError(f"KPI '{repeated['KPI'].iloc[0]}' appears twice under the same objective")
+
+        stats = leaf_stats(df["Green"], df["Amber"], df["Red"], df["Average Score"].astype(float))
+        table = pd.concat([df[LEVELS], pd.DataFrame(stats, index=df.index).astype(float)], axis=1)
+        self.stats = {(): table[STAT_COLUMNS].sum().to_numpy()}
+        self.children = {(): []}
+        # Each level in order of first appearance, so children keep the data's order
+        for depth in range(1, len(LEVELS) + 1):
+            grouped = table.groupby(LEVELS[:depth], sort=False)[STAT_COLUMNS].sum()
+            for key, values in zip(grouped.index, grouped.to_numpy()):
+                path = key if isinstance(key, tuple) else (key,)
+                self.stats[path] = values
+                self.children.setdefault(path[:-1], []).append(path)
+                self.children.setdefault(path, [])
+
+    def kpis(self):
+        return [path for path in self.stats if len(path) == len(LEVELS)]
+
+    def score(self, path):
+        # Missing (NaN) when none of the node's KPIs has a score
+        _, _, _, weighted, scored_projects, score_sum, scored_kpis = self.stats[path]
+        if scored_projects > 0:
+            return weighted / scored_projects
+        return score_sum / scored_kpis if scored_kpis else np.nan
+
+    def node_table(self, path=()):
+        # The node's children as a chart-ready KPI table (one bar per child)
+        children = self.children[path]
+        stats = np.array([self.stats[child] for child in children]).reshape(-1, len(STAT_COLUMNS))
+        return build_dataframe(
+            [child[-1] for child in children],
+            [round(self.score(child), 1) for child in children],
+            *np.rint(stats[:, :3]).T,
+        )
+
+    def update_kpi(self, path, score, green, amber, red):
+        # score may be None or NaN for a KPI without a score
+        score = np.nan if score is None else score
+        new = np.array([float(value) for value in leaf_stats(green, amber, red, score).values()])
+        delta = new - self.stats[path]
+        for depth in range(len(path) + 1):
+            self.stats[path[:depth]] = self.stats[path[:depth]] + delta
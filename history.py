@@ -0,0 +1,130 @@
+import json
+import os
+import re
+from datetime import datetime
+from pathlib import Path
+
+import matplotlib.pyplot as plt
+import pandas as pd
+
+from kpi_chart import STATUSES
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional: only needed for the snapshot history
+    pa = pq = None
+
+HISTORY_DIR = Path("kpi_history")
+INDEX_FILE = "index.json"
+SNAPSHOT_COLUMNS = ["KPI", "Average Score", "Green", "Amber", "Red"]
+TREND_MAX_KPIS = 10
+
+
+# Append-only snapshot store: one Parquet file per saved dataset, partitioned as
+# <root>/pillar=<pillar>/period=<period>/<saved at>.parquet. The JSON index lists
+# every file, so queries pick the files they need without listing directories.
+def current_period(today=None):
+    today = today or datetime.now()
+    return f"{today.year}-Q{(today.month - 1) // 3 + 1}"
+
+
+def partition_name(value):
+    return re.sub(r"[^A-Za-z0-9._-]+", "_", str(value).strip()) or "_"
+
+
+def load_index(root=HISTORY_DIR):
+    index_path = Path(root) / INDEX_FILE
+    if index_path.exists():
+        return json.loads(index_path.read_text())
+    return []
+
+
+def save_index(root, index):
+    index_path = Path(root) / INDEX_FILE
+    tmp_path = index_path.with_suffix(".tmp")
+    tmp_path.write_text(json.dumps(index, indent=2))
+    os.replace(tmp_path, index_path)
+
+
+def save_snapshot(df, pillar, period, root=HISTORY_DIR, saved_at=None):
+    if pq is None:
+        raise ValueError("Saving snapshots needs the pyarrow package")
+    saved_at = saved_at or datetime.now()
+    root = Path(root)
+    rel = Path(f"pillar={partition_name(pillar)}", f"period={partition_name(period)}",
+               f"{saved_at:%Y%m%dT%H%M%S%f}.parquet")
+    (root / rel).parent.mkdir(parents=True, exist_ok=True)
+    table = pa.Table.from_pandas(df[SNAPSHOT_COLUMNS].astype({"KPI": str}), preserve_index=False)
+    pq.write_table(table, root / rel)
+
+    index = load_index(root)
+    index.append({"pillar": pillar, "period": str(period), "saved_at": saved_at.isoformat(),
+                  "path": rel.as_posix(), "kpis": len(df)})
+    save_index(root, index)
+    return rel
+
+
+def history_pillars(root=HISTORY_DIR):
+    return list(dict.fromkeys(entry["pillar"] for entry in load_index(root)))
+
+
+def query_history(pillar, kpis=None, root=HISTORY_DIR):
+    # Partition pruning via the index: only this pillar's files are opened, and
+    # only the latest snapshot of each period (re-saving a period supersedes it)
+    latest = {}
+    for entry in load_index(root):
+        if entry["pillar"] == pillar and entry["saved_at"] >= latest.get(entry["period"], {}).get("saved_at", ""):
+            latest[entry["period"]] = entry
+    if not latest:
+        return pd.DataFrame(columns=["Period"] + SNAPSHOT_COLUMNS)
+
+    frames = []
+    filters = [("KPI", "in", list(kpis))] if kpis else None
+    for period in sorted(latest):
+        table = pq.read_table(Path(root) / latest[period]["path"], columns=SNAPSHOT_COLUMNS, filters=filters)
+        frames.append(table.to_pandas().assign(Period=period))
+    history = pd.concat(frames, ignore_index=True)
+    return history[["Period"] + SNAPSHOT_COLUMNS]
+
+
+def trend_series(history):
+    # Per period: project-weighted average score and RAG shares (%) over the queried KPIs
+    totals = history["Green"] + history["Amber"] + history["Red"]
+    grouped = history.assign(Weighted=history["Average Score"] * totals, Total=totals).groupby("Period", sort=False)
+    sums = grouped[["Weighted", "Total", "Green", "Amber", "Red"]].sum()
+    trend = pd.DataFrame(index=sums.index)
+    trend["Average Score"] = (sums["Weighted"] / sums["Total"].where(sums["Total"] > 0)).fillna(
+        grouped["Average Score"].mean())
+    for column, _, _, _ in STATUSES:
+        trend[f"{column} share"] = (sums[column] / sums["Total"].where(sums["Total"] > 0) * 100).fillna(0)
+    return trend
+
+
+def render_trend(history, chart_title):
+    trend = trend_series(history)
+    periods = trend.index.tolist()
+    fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(14, 9), sharex=True, gridspec_kw={"height_ratios": [3, 2]})
+
+    # Individual KPI lines only while they stay readable; the pillar line is always drawn
+    kpis = history["KPI"].unique()
+    if len(kpis) <= TREND_MAX_KPIS:
+        scores = history.pivot_table(index="Period", columns="KPI", values="Average Score", sort=False)
+        for kpi in kpis:
+            ax1.plot(periods, scores.reindex(periods)[kpi], marker="o", linewidth=1, alpha=0.7, label=kpi)
+    ax1.plot(periods, trend["Average Score"], color="black", marker="o", linewidth=2.5,
+             label="Project-weighted average")
+    ax1.set_ylim(0, 105)
+    ax1.set_ylabel("Average Score (%)")
+    ax1.legend(loc="upper left", bbox_to_anchor=(1.01, 1), frameon=False)
+    ax1.set_title(chart_title.strip() or "KPI Trend", pad=20)
+
+    ax2.stackplot(periods, *(trend[f"{column} share"] for column, _, _, _ in STATUSES),
+                  colors=[color for _, color, _, _ in STATUSES], labels=[column for column, _, _, _ in STATUSES])
+    ax2.set_ylim(0, 100)
+    ax2.set_ylabel("Share of projects (%)")
+    ax2.set_xlabel("Period")
+    ax2.legend(loc="upper left", bbox_to_anchor=(1.01, 1), frameon=False)
+    plt.setp(ax2.get_xticklabels(), rotation=45, ha="right")
+    fig.tight_layout()
+    return fig
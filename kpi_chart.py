@@ -0,0 +1,517 @@
+import io
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+from matplotlib.lines import Line2D
+from PIL import Image
+
+CHART_TITLES = [
+    "Modern Infrastructure KPI Performance",
+    "Thriving Economy KPI Performance",
+    "Human Centric City KPI Performance",
+    "Effective Governance KPI Performance"
+]
+
+LEGEND_STYLES = ["Separate (default)", "Unified (bottom combined legend)"]
+SCORE_LINE_STYLES = ["Black line", "Colored dots by score"]
+STACK_TYPES = ["Raw counts (default)", "100% stacked (proportional)"]
+LABEL_OPTIONS = ["No labels", "Show total only", "Show all segment labels"]
+
+# Draft renders: low resolution, no tight-bbox pass, at most this many labelled KPIs
+DRAFT_DPI = 50
+DRAFT_MAX_LABELS = 40
+
+# Figure sizing: the default 14x7 figure grows with KPI count and label length up to
+# a cap; beyond KPIS_PER_PAGE the chart is split into pages
+KPIS_PER_PAGE = 50
+MAX_FIGURE_WIDTH = 30
+
+# Headers accepted for each column when data comes from a file rather than the text areas
+COLUMN_ALIASES = {
+    "KPI": ["KPI"],
+    "Average Score": ["Average Score", "Average Score (%)"],
+    "Green": ["Green", "Count of Green"],
+    "Amber": ["Amber", "Count of Amber"],
+    "Red": ["Red", "Count of Red"],
+}
+
+
+# Score bands: (upper bound, colour, legend label)
+SCORE_BANDS = [
+    (60, "red", "Avg Score 0–59%"),
+    (80, "orange", "Avg Score 60–79%"),
+    (float("inf"), "green", "Avg Score 80–100%"),
+]
+
+# RAG statuses: (column, colour, legend label, segment label colour)
+STATUSES = [
+    ("Green", "green", "Number of Projects in Green", "white"),
+    ("Amber", "orange", "Number of Projects in Amber", "black"),
+    ("Red", "red", "Number of Projects in Red", "white"),
+]
+
+
+# Score color logic
+def score_color(score):
+    for upper, color, _ in SCORE_BANDS:
+        if score < upper:
+            return color
+    return SCORE_BANDS[-1][1]
+
+
+# Input parsing
+def parse_score(value):
+    return float(str(value).strip().replace('%', ''))
+
+
+# Pasted columns, in input order: (name, cast, what a value must be)
+PASTED_COLUMNS = [
+    ("KPI", str, "text"),
+    ("Average Score", parse_score, "a number"),
+    ("Count of Green", int, "a whole number"),
+    ("Count of Amber", int, "a whole number"),
+    ("Count of Red", int, "a whole number"),
+]
+# Extra pasted column for the heatmap
+PERIOD_COLUMN = ("Period", str, "text")
+
+# Limits on pasted input, per column
+MAX_INPUT_ROWS = 20_000
+MAX_INPUT_CHARS = 1_000_000
+
+
+def iter_lines(text):
+    # (line number, stripped line) for non-blank lines, without splitting the whole text up front
+    for number, line in enumerate(io.StringIO(text), 1):
+        line = line.strip()
+        if line:
+            yield number, line
+
+
+def count_lines(text, limit=None):
+    # Stops counting once past `limit`
+    count = 0
+    for _ in iter_lines(text):
+        count += 1
+        if limit is not None and count > limit:
+            break
+    return count
+
+
+def validate_columns(texts, max_rows=MAX_INPUT_ROWS, max_chars=MAX_INPUT_CHARS, columns=PASTED_COLUMNS):
+    # Cheap structural checks before anything is parsed: size, row count, equal lengths
+    counts = []
+    for (name, _, _), text in zip(columns, texts):
+        if len(text) > max_chars:
+            raise ValueError(f"{name} is too large ({len(text):,} characters; the limit is {max_chars:,})")
+        counts.append(count_lines(text, max_rows))
+        if counts[-1] > max_rows:
+            raise ValueError(f"{name} has more than {max_rows:,} entries")
+    for (name, _, _), count in zip(columns[1:], counts[1:]):
+        if count != counts[0]:
+            raise ValueError(f"{name} has {count} entries but KPI has {counts[0]}")
+    return counts[0]
+
+
+def parse_column(text, position, columns=PASTED_COLUMNS):
+    name, cast, kind = columns[position]
+    values = []
+    for number, line in iter_lines(text):
+        try:
+            values.append(cast(line))
+        except ValueError:
+            raise ValueError(f"{name}, line {number}: '{line[:40]}' is not {kind}") from None
+    return values
+
+
+# KPI tables use compact column types: names as a categorical (each distinct
+# name stored once, categories in order of appearance), float32 scores and
+# int32 counts. Roughly a third of the default int64/float64/object footprint.
+KPI_DTYPES = {"Average Score": np.float32, "Green": np.int32, "Amber": np.int32, "Red": np.int32}
+
+
+def compact_kpis(kpis):
+    # Codes number the distinct names in order of first appearance
+    codes, names = pd.factorize(np.asarray(kpis, dtype=object))
+    return pd.Categorical.from_codes(codes, names)
+
+
+def build_dataframe(kpis, avg_scores, greens, ambers, reds):
+    return pd.DataFrame({
+        "KPI": compact_kpis(kpis),
+        "Average Score": np.asarray(avg_scores, dtype=KPI_DTYPES["Average Score"]),
+        "Green": np.asarray(greens, dtype=KPI_DTYPES["Green"]),
+        "Amber": np.asarray(ambers, dtype=KPI_DTYPES["Amber"]),
+        "Red": np.asarray(reds, dtype=KPI_DTYPES["Red"]),
+    })
+
+
+def compact_table(df):
+    # Back to the compact types after pandas operations that widen them (e.g. concat)
+    return df.assign(KPI=compact_kpis(df["KPI"])).astype(KPI_DTYPES)
+
+
+def normalize_columns(df):
+    renames = {}
+    for column, aliases in COLUMN_ALIASES.items():
+        match = next((c for c in df.columns if str(c).strip() in aliases), None)
+        if match is None:
+            raise ValueError(f"Missing column '{column}'")
+        renames[match] = column
+    df = df.rename(columns=renames)[list(COLUMN_ALIASES)]
+    return build_dataframe(
+        df["KPI"].astype(str).str.strip().tolist(),
+        [parse_score(x) for x in df["Average Score"]],
+        df["Green"].astype(int).tolist(),
+        df["Amber"].astype(int).tolist(),
+        df["Red"].astype(int).tolist(),
+    )
+
+
+# Ordering and Top-N, done on the DataFrame before any artist is created
+SORT_OPTIONS = [
+    "Paste order (default)",
+    "Average score (lowest first)",
+    "Average score (highest first)",
+    "Total projects (most first)",
+    "Red share (highest first)",
+]
+
+
+def arrange_kpis(df, sort_by=SORT_OPTIONS[0], top_n=None):
+    totals = df["Green"] + df["Amber"] + df["Red"]
+    if sort_by == "Average score (lowest first)":
+        key, ascending = df["Average Score"], True
+    elif sort_by == "Average score (highest first)":
+        key, ascending = df["Average Score"], False
+    elif sort_by == "Total projects (most first)":
+        key, ascending = totals, False
+    elif sort_by == "Red share (highest first)":
+        key, ascending = (df["Red"] / totals.where(totals > 0)).fillna(0), False
+    else:
+        key = None
+    if key is not None:
+        order = key.sort_values(ascending=ascending, kind="stable").index
+        df, totals = df.loc[order], totals.loc[order]
+
+    if not top_n or len(df) <= top_n:
+        return df.reset_index(drop=True)
+
+    # Collapse the remainder into one bar; its score is weighted by project count
+    rest, rest_totals = df.iloc[top_n:], totals.iloc[top_n:]
+    if rest_totals.sum() > 0:
+        rest_score = (rest["Average Score"] * rest_totals).sum() / rest_totals.sum()
+    else:
+        rest_score = rest["Average Score"].mean()
+    others = pd.DataFrame({
+        "KPI": [f"Others ({len(rest)} KPIs)"],
+        "Average Score": [rest_score],
+        "Green": [rest["Green"].sum()],
+        "Amber": [rest["Amber"].sum()],
+        "Red": [rest["Red"].sum()],
+    })
+    return compact_table(pd.concat([df.iloc[:top_n], others], ignore_index=True))
+
+
+# Sizing and pagination
+def figure_size(df):
+    longest = df["KPI"].astype(str).str.len().max() if len(df) else 0
+    width = min(max(14, 0.28 * len(df) + 2), MAX_FIGURE_WIDTH)
+    # Rotated tick labels take vertical space
+    height = min(7 + max(0, longest - 25) * 0.06, 11)
+    return width, height
+
+
+def page_count(df, per_page=KPIS_PER_PAGE):
+    return max(1, -(-len(df) // per_page))
+
+
+def get_page(df, page, per_page=KPIS_PER_PAGE):
+    return df.iloc[page * per_page:(page + 1) * per_page]
+
+
+def shared_ymax(df, stack_type):
+    # Same y-scale on every page of a paginated chart (proportional charts are always 0-100)
+    if stack_type == "100% stacked (proportional)" or df.empty:
+        return None
+    return (df["Green"] + df["Amber"] + df["Red"]).max() * 1.1 + 2
+
+
+# Stacked segments from one (KPIs x statuses) counts matrix. The 100% mode
+# divides it by the row totals in a single step; KPIs with no projects get
+# zero-height segments (flagged in `empty`) rather than NaN.
+def stack_heights(df, proportional=False):
+    counts = df[[column for column, _, _, _ in STATUSES]].to_numpy(dtype=float)
+    totals = counts.sum(axis=1, keepdims=True)
+    empty = totals[:, 0] == 0
+    if proportional:
+        counts = np.divide(counts, totals, out=np.zeros_like(counts), where=totals > 0) * 100
+    bottoms = np.cumsum(counts, axis=1) - counts
+    return counts, bottoms, empty
+
+
+# Chart rendering
+def draw_chart(ax1, df, chart_title, legend_style=LEGEND_STYLES[0], score_line_style=SCORE_LINE_STYLES[0],
+               stack_type=STACK_TYPES[0], label_option=LABEL_OPTIONS[0], draft=False, ymax=None, max_labels=None):
+    df = df.reset_index(drop=True)
+    # Drafts (and budget-limited charts) only label every `step`-th KPI
+    if draft:
+        max_labels = min(max_labels or DRAFT_MAX_LABELS, DRAFT_MAX_LABELS)
+    step = max(1, -(-len(df) // max_labels)) if max_labels else 1
+
+    proportional = stack_type == "100% stacked (proportional)"
+    heights, bottoms, empty = stack_heights(df, proportional)
+    for j, (_, color, label, _) in enumerate(STATUSES):
+        ax1.bar(df["KPI"], heights[:, j], bottom=bottoms[:, j], label=label, color=color)
+    if proportional:
+        ax1.set_ylabel("Proportion (%)")
+        ax1.set_ylim(0, 100)
+        # KPIs without projects have no proportions: an empty outlined bar with a marker
+        if empty.any():
+            positions = np.flatnonzero(empty)
+            ax1.bar(positions, 100, fill=False, edgecolor="grey", linestyle="--", label="No projects")
+            ax1.plot(positions, np.full(len(positions), 50), "x", color="grey", markersize=8)
+    else:
+        ax1.set_ylabel("Number of Projects")
+        if ymax:
+            ax1.set_ylim(0, ymax)
+
+    ax1.tick_params(axis='x', rotation=90)
+    if step > 1:
+        ax1.set_xticks(range(0, len(df), step))
+        ax1.set_xticklabels(df["KPI"][::step])
+
+    # Add labels, positioned from the same heights and bottoms as the bars
+    totals = heights.sum(axis=1)
+    for i in range(0, len(df), step):
+        if proportional and empty[i]:
+            continue
+        if label_option == "Show total only":
+            ax1.text(i, totals[i] + (1.5 if proportional else 2),
+                     f"{round(totals[i])}", ha='center', va='bottom', fontsize=9, fontweight='bold')
+
+        elif label_option == "Show all segment labels":
+            for j, (_, _, _, text_color) in enumerate(STATUSES):
+                if heights[i, j] > 0:
+                    ax1.text(i, bottoms[i, j] + heights[i, j] / 2, f"{round(heights[i, j])}", ha='center',
+                             va='center', color=text_color, fontsize=8, fontweight='bold')
+
+    # Score line
+    ax2 = ax1.twinx()
+    ax2.set_ylim(0, 100)
+    ax2.set_ylabel("Average Score (%)")
+    ax2.plot(df["KPI"], df["Average Score"], color="black", linewidth=1)
+
+    if score_line_style == "Colored dots by score":
+        colors = [score_color(score) for score in df["Average Score"]]
+        for i, (x, y, c) in enumerate(zip(df["KPI"], df["Average Score"], colors)):
+            ax2.plot(i, y, 'o', color=c, markersize=8)
+        dot_legend = [
+            Line2D([0], [0], marker='o', color='black', label=label, markerfacecolor=color, markersize=8)
+            for _, color, label in SCORE_BANDS
+        ]
+    else:
+        dot_legend = []
+
+    ax1.set_title(chart_title.strip() or "KPI Chart", pad=20)
+
+    # Legends
+    bar_handles, bar_labels = ax1.get_legend_handles_labels()
+    if legend_style == "Separate (default)":
+        ax1.legend(bar_handles, bar_labels, loc="upper left")
+        if score_line_style == "Colored dots by score":
+            ax1.legend(handles=bar_handles + dot_legend, loc="upper right")
+        elif score_line_style == "Black line":
+            ax2.legend(["Average Score (%)"], loc="upper right")
+    else:
+        all_handles = bar_handles + dot_legend
+        all_labels = bar_labels + [h.get_label() for h in dot_legend]
+        ax1.legend(all_handles, all_labels, loc="lower center", bbox_to_anchor=(0.5, -0.35), ncol=4, frameon=False)
+
+    return bar_handles + dot_legend
+
+
+def render_chart(df, chart_title, legend_style=LEGEND_STYLES[0], score_line_style=SCORE_LINE_STYLES[0],
+                 stack_type=STACK_TYPES[0], label_option=LABEL_OPTIONS[0], draft=False, figsize=None, ymax=None,
+                 max_labels=None):
+    fig, ax1 = plt.subplots(figsize=figsize or figure_size(df))
+    draw_chart(ax1, df, chart_title, legend_style, score_line_style, stack_type, label_option, draft, ymax, max_labels)
+    if legend_style == "Separate (default)":
+        fig.subplots_adjust(top=0.85)
+    else:
+        fig.subplots_adjust(bottom=0.4)
+    return fig
+
+
+def render_page(df, chart_title, page, legend_style=LEGEND_STYLES[0], score_line_style=SCORE_LINE_STYLES[0],
+                stack_type=STACK_TYPES[0], label_option=LABEL_OPTIONS[0], draft=False, per_page=KPIS_PER_PAGE,
+                max_labels=None):
+    # One page of a long KPI list, drawn on the y-scale of the whole list
+    pages = page_count(df, per_page)
+    if pages == 1:
+        return render_chart(df, chart_title, legend_style, score_line_style, stack_type, label_option, draft,
+                            max_labels=max_labels)
+    return render_chart(get_page(df, page, per_page), f"{chart_title} ({page + 1}/{pages})", legend_style,
+                        score_line_style, stack_type, label_option, draft, ymax=shared_ymax(df, stack_type),
+                        max_labels=max_labels)
+
+
+def render_pages(df, chart_title, *options, per_page=KPIS_PER_PAGE):
+    # Lazily yields one figure per page
+    for page in range(page_count(df, per_page)):
+        yield render_page(df, chart_title, page, *options, per_page=per_page)
+
+
+# All pillars in one figure, sharing the same options
+def render_dashboard(datasets, legend_style=LEGEND_STYLES[0], score_line_style=SCORE_LINE_STYLES[0],
+                     stack_type=STACK_TYPES[0], label_option=LABEL_OPTIONS[0], draft=False, max_labels=None):
+    ncols = 2 if len(datasets) > 1 else 1
+    nrows = -(-len(datasets) // ncols)
+    fig, axes = plt.subplots(nrows, ncols, figsize=(14 * ncols, 9 * nrows), squeeze=False)
+
+    for ax1, (chart_title, df) in zip(axes.flat, datasets.items()):
+        handles = draw_chart(ax1, df, chart_title, legend_style, score_line_style, stack_type, label_option, draft,
+                             max_labels=max_labels)
+    for ax1 in list(axes.flat)[len(datasets):]:
+        ax1.set_visible(False)
+
+    if legend_style == "Separate (default)":
+        fig.subplots_adjust(hspace=0.9, wspace=0.25)
+    else:
+        # One combined legend for the whole grid instead of one under every panel
+        for ax1 in axes.flat:
+            if ax1.get_legend():
+                ax1.get_legend().remove()
+        fig.legend(handles, [h.get_label() for h in handles], loc="lower center", ncol=len(handles), frameon=False)
+        fig.subplots_adjust(hspace=0.9, wspace=0.25, bottom=0.12)
+    return fig
+
+
+# Render budget. Rough cost model fitted on the Agg backend: a fixed figure
+# cost, a per-KPI cost (bars, score line), a per-tick-label cost and a
+# per-value-label cost for drawing, plus rasterization, which grows with pixel
+# count (the square of the DPI) but is small next to drawing the artists.
+RENDER_BUDGET_SECONDS = 3.0
+BASE_COST = 0.25
+KPI_COST = 0.005
+TICK_COST = 0.004
+LABEL_COST = 0.0006
+RASTER_COST = 0.06  # per panel, at 100 DPI
+BUDGET_MAX_LABELS = 60
+BUDGET_DPI = 72
+MIN_PAGE_KPIS = 10
+
+
+def estimate_render_seconds(n_kpis, label_option, dpi=None, max_labels=None, panels=1):
+    # max_labels applies to each panel of a dashboard
+    labelled = min(n_kpis, max_labels * panels) if max_labels else n_kpis
+    labels = {"Show total only": 1, "Show all segment labels": 3}.get(label_option, 0) * labelled
+    pixels = ((dpi or 100) / 100) ** 2
+    cost = BASE_COST + KPI_COST * n_kpis + TICK_COST * labelled + LABEL_COST * labels
+    return cost + RASTER_COST * panels * pixels
+
+
+def drawn_kpis(n_kpis, panels=1, per_page=None):
+    # KPIs drawn in one render when every panel shows at most one page
+    return min(n_kpis, per_page * panels) if per_page else n_kpis
+
+
+def ordinal(n):
+    suffix = "th" if 10 <= n % 100 <= 20 else {1: "st", 2: "nd", 3: "rd"}.get(n % 10, "th")
+    return f"{n}{suffix}"
+
+
+def paginate_to_budget(n_kpis, label_option, budget, dpi=None, max_labels=None, panels=1, per_page=None):
+    # Halve the KPIs per page (per panel) until the estimate fits, down to MIN_PAGE_KPIS
+    per_panel = -(-n_kpis // panels)
+    while (estimate_render_seconds(drawn_kpis(n_kpis, panels, per_page), label_option, dpi, max_labels, panels)
+           > budget and (per_page or per_panel) > MIN_PAGE_KPIS):
+        per_page = max(MIN_PAGE_KPIS, min(per_page or per_panel, 2 * KPIS_PER_PAGE) // 2)
+    return per_page
+
+
+def fit_to_budget(n_kpis, options, budget=RENDER_BUDGET_SECONDS, dpi=None, panels=1, per_page=None,
+                  lower_dpi=True, paginate=True):
+    # Degrade step by step until the estimate fits: segment labels, label
+    # thinning, resolution, then pagination. n_kpis counts every KPI over all
+    # panels; per_page is the pagination already in place (None: one page).
+    # Returns the options, label limit, dpi and KPIs per page to render with, a
+    # note for each step taken and whether the final estimate is within budget.
+    # Exports pass lower_dpi=False to keep the requested resolution.
+    legend_style, score_line_style, stack_type, label_option = options
+    max_labels = None
+    notes = []
+
+    def estimate():
+        return estimate_render_seconds(drawn_kpis(n_kpis, panels, per_page), label_option, dpi, max_labels, panels)
+
+    if not budget or estimate() <= budget:
+        return options, max_labels, dpi, per_page, notes, True
+
+    if label_option == "Show all segment labels":
+        label_option = "Show total only"
+        notes.append("segment labels replaced by totals")
+    per_panel = -(-drawn_kpis(n_kpis, panels, per_page) // panels)
+    if estimate() > budget and per_panel > BUDGET_MAX_LABELS:
+        max_labels = BUDGET_MAX_LABELS
+        notes.append(f"only every {ordinal(-(-per_panel // max_labels))} KPI labelled")
+    if lower_dpi and estimate() > budget and (dpi or 100) > BUDGET_DPI:
+        dpi = BUDGET_DPI
+        notes.append(f"resolution lowered to {dpi} DPI")
+    if paginate and estimate() > budget:
+        paged = paginate_to_budget(n_kpis, label_option, budget, dpi, max_labels, panels, per_page)
+        if paged != per_page:
+            per_page = paged
+            notes.append(f"split into pages of {per_page} KPIs" + (" per panel" if panels > 1 else ""))
+            if max_labels and per_page <= max_labels:
+                # Every KPI on a page fits the label limit again
+                notes = [note for note in notes if not note.startswith("only every")]
+                max_labels = None
+    return (legend_style, score_line_style, stack_type, label_option), max_labels, dpi, per_page, notes, \
+        estimate() <= budget
+
+
+# Export
+EXPORT_FORMATS = {
+    "PNG": ("png", "image/png"),
+    "SVG": ("svg", "image/svg+xml"),
+    "PDF": ("pdf", "application/pdf"),
+}
+
+
+def export_figure(fig, fmt="png", dpi=None, width=None, tight=True):
+    # A target pixel width overrides dpi (approximate, as the tight bbox trims margins)
+    if width:
+        dpi = width / fig.get_size_inches()[0]
+    buf = io.BytesIO()
+    fig.savefig(buf, format=fmt, dpi=dpi or "figure", bbox_inches="tight" if tight else None)
+    return buf.getvalue()
+
+
+def draft_png(fig):
+    return export_figure(fig, "png", DRAFT_DPI, tight=False)
+
+
+# PNG size reduction. The charts use a handful of flat colours, so an indexed
+# palette is usually several times smaller than the default RGBA output.
+def compress_png(data, compress_level=9, palette_colors=None):
+    image = Image.open(io.BytesIO(data))
+    if palette_colors:
+        image = image.convert("RGB").quantize(colors=palette_colors)
+    buf = io.BytesIO()
+    image.save(buf, format="PNG", optimize=compress_level == 9, compress_level=compress_level)
+    return buf.getvalue()
+
+
+def png_to_webp(data, quality=80):
+    image = Image.open(io.BytesIO(data)).convert("RGB")
+    buf = io.BytesIO()
+    image.save(buf, format="WEBP", quality=quality)
+    return buf.getvalue()
+
+
+def format_size(num_bytes):
+    if num_bytes < 1024:
+        return f"{num_bytes} B"
+    return f"{num_bytes / 1024:.1f} KB"
@@ -0,0 +1,63 @@
+import hashlib
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+from history import load_index, save_index
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:  # optional: only needed for the dataset library
+    pq = None
+
+LIBRARY_DIR = Path("kpi_library")
+COMPRESSION = "zstd"
+
+
+# Named, parsed datasets. Files are content-addressed (<hash>.parquet, zstd
+# compressed) so saving the same data under another name stores nothing new;
+# the index maps names to hashes, and the latest save of a name wins.
+def dataset_hash(df):
+    digest = hashlib.sha256(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    digest.update(",".join(map(str, df.columns)).encode())
+    return digest.hexdigest()[:32]
+
+
+def save_dataset(df, name, root=LIBRARY_DIR):
+    if pq is None:
+        raise ValueError("Saving datasets needs the pyarrow package")
+    name = name.strip()
+    if not name:
+        raise ValueError("Give the dataset a name")
+    root = Path(root)
+    root.mkdir(parents=True, exist_ok=True)
+    df = df.reset_index(drop=True)
+    digest = dataset_hash(df)
+    path = root / f"{digest}.parquet"
+    if not path.exists():
+        df.to_parquet(path, compression=COMPRESSION, index=False)
+
+    index = [entry for entry in load_index(root) if entry["name"] != name]
+    index.append({"name": name, "hash": digest, "saved_at": datetime.now().isoformat(), "kpis": len(df)})
+    save_index(root, index)
+    return digest
+
+
+def saved_datasets(root=LIBRARY_DIR):
+    # {name: hash}, most recently saved first
+    return {entry["name"]: entry["hash"] for entry in reversed(load_index(root))}
+
+
+def load_dataset(digest, root=LIBRARY_DIR):
+    # Straight back to the typed table; no text parsing involved
+    return pd.read_parquet(Path(root) / f"{digest}.parquet")
+
+
+def delete_dataset(name, root=LIBRARY_DIR):
+    index = load_index(root)
+    remaining = [entry for entry in index if entry["name"] != name]
+    save_index(root, remaining)
+    # Remove the file once no other name points at it
+    for digest in {entry["hash"] for entry in index} - {entry["hash"] for entry in remaining}:
+        (Path(root) / f"{digest}.parquet").unlink(missing_ok=True)
@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+
+from kpi_chart import SCORE_BANDS, STATUSES, compact_table
+
+# Scores below the first band boundary are "red", from the second one "green"
+LOW_SCORE, HIGH_SCORE = SCORE_BANDS[0][0], SCORE_BANDS[1][0]
+
+
+# Data-quality checks. Every check is one boolean mask over the whole table, so
+# all problems are found in a single pass; a row may fail several checks.
+def quality_checks(df):
+    scores = df["Average Score"].astype(float)
+    counts = df[[column for column, _, _, _ in STATUSES]].to_numpy()
+    totals = counts.sum(axis=1)
+    keys = [c for c in ["Period", "Pillar", "Objective", "KPI"] if c in df]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        shares = counts / totals[:, None]
+
+    checks = {
+        "Missing average score": scores.isna().to_numpy(),
+        "Average score outside 0–100%": ((scores < 0) | (scores > 100)).to_numpy(),
+        "No projects": totals == 0,
+        "Duplicate KPI name" + (" in the same group" if len(keys) > 1 else ""): df.duplicated(keys, keep=False).to_numpy(),
+        f"Score of {HIGH_SCORE}%+ but most projects are Red": (scores >= HIGH_SCORE).to_numpy() & (shares[:, 2] > 0.5),
+        f"Score under {LOW_SCORE}% but most projects are Green": (scores < LOW_SCORE).to_numpy() & (shares[:, 0] > 0.5),
+    }
+    for j, (column, _, _, _) in enumerate(STATUSES):
+        checks[f"Negative count of {column}"] = counts[:, j] < 0
+    return checks
+
+
+def quality_issues(df):
+    # One row per (row, failed check); row numbers count from 1 as pasted
+    frames = []
+    for issue, mask in quality_checks(df).items():
+        rows = np.flatnonzero(mask)
+        if len(rows):
+            frames.append(pd.DataFrame({"Row": rows + 1, "KPI": df["KPI"].to_numpy()[rows].astype(str), "Issue": issue}))
+    if not frames:
+        return pd.DataFrame(columns=["Row", "KPI", "Issue"])
+    return pd.concat(frames, ignore_index=True).sort_values("Row", kind="stable", ignore_index=True)
+
+
+def exclude_issues(df, issues):
+    flagged = issues["Row"].unique() - 1
+    return compact_table(df.drop(index=df.index[flagged]).reset_index(drop=True))
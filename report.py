@@ -0,0 +1,25 @@
+import tempfile
+
+import matplotlib.pyplot as plt
+from matplotlib.backends.backend_pdf import PdfPages
+
+
+# Multi-page PDF reports. `figures` should be a lazy iterable (e.g. a generator
+# calling render_chart): each page is rendered, written and closed before the
+# next one is created, so memory stays flat regardless of page count.
+def write_pdf_report(figures, target, title="KPI Performance Report"):
+    count = 0
+    with PdfPages(target, metadata={"Title": title}) as pdf:
+        for fig in figures:
+            pdf.savefig(fig, bbox_inches="tight")
+            plt.close(fig)
+            count += 1
+    return count
+
+
+def pdf_report_bytes(figures, title="KPI Performance Report"):
+    # Spool through a temporary file so large reports go to disk rather than RAM
+    with tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024) as tmp:
+        write_pdf_report(figures, tmp, title)
+        tmp.seek(0)
+        return tmp.read()
@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+
+from kpi_chart import SCORE_BANDS, STATUSES
+
+WORST_KPIS = 5
+
+
+# Headline numbers for one pillar, straight from the KPI table (no rendering)
+def pillar_summary(df, worst=WORST_KPIS):
+    counts = df[[column for column, _, _, _ in STATUSES]].sum()
+    totals = df["Green"] + df["Amber"] + df["Red"]
+    scores = df["Average Score"].astype(float)
+
+    # KPIs are weighted by their number of projects; without any projects, a plain mean.
+    # KPIs without a score (flagged by the data checks) are left out of both.
+    scored = scores.notna()
+    if totals[scored].sum() > 0:
+        weighted_score = float((scores * totals)[scored].sum() / totals[scored].sum())
+    else:
+        weighted_score = float(scores.mean()) if scored.any() else 0.0
+
+    # Same bands (and boundaries) as score_color
+    bands = np.searchsorted([upper for upper, _, _ in SCORE_BANDS[:-1]], scores[scored].to_numpy(), side="right")
+    band_share = pd.Series(np.bincount(bands, minlength=len(SCORE_BANDS)) / max(len(df), 1),
+                           index=[label for _, _, label in SCORE_BANDS])
+
+    worst_kpis = df.assign(**{"Red share": (df["Red"] / totals.where(totals > 0) * 100).round(1)})
+    worst_kpis = worst_kpis.sort_values(["Average Score", "Red share"], ascending=[True, False], kind="stable")
+    return {
+        "kpis": len(df),
+        "projects": int(counts.sum()),
+        "counts": counts.astype(int),
+        "weighted_score": weighted_score,
+        "band_share": band_share,
+        "worst": worst_kpis[["KPI", "Average Score", "Red share"]].head(worst).reset_index(drop=True),
+    }
+
+
+def summary_table(summaries):
+    # One row per pillar, for comparing pillars side by side
+    rows = []
+    for title, summary in summaries.items():
+        row = {"Pillar": title, "KPIs": summary["kpis"], "Projects": summary["projects"]}
+        row.update(summary["counts"].to_dict())
+        row["Weighted avg score"] = round(summary["weighted_score"], 1)
+        row.update((label, f"{share:.0%}") for label, share in summary["band_share"].items())
+        rows.append(row)
+    return pd.DataFrame(rows)
@@ -0,0 +1,120 @@
+from kpi_chart import LEGEND_STYLES, SCORE_LINE_STYLES, STACK_TYPES, LABEL_OPTIONS, SCORE_BANDS, STATUSES
+
+VEGA_LITE_SCHEMA = "https://vega.github.io/schema/vega-lite/v5.json"
+
+
+# Vega-Lite version of kpi_chart.render_chart. The spec carries the data and is
+# drawn in the browser, so the server only ships a few KB of JSON.
+def score_band_expr():
+    expr = f"'{SCORE_BANDS[-1][2]}'"
+    for upper, _, label in reversed(SCORE_BANDS[:-1]):
+        expr = f"datum['Average Score'] < {upper} ? '{label}' : {expr}"
+    return expr
+
+
+def chart_spec(df, chart_title, legend_style=LEGEND_STYLES[0], score_line_style=SCORE_LINE_STYLES[0],
+               stack_type=STACK_TYPES[0], label_option=LABEL_OPTIONS[0], ymax=None):
+    proportional = stack_type == "100% stacked (proportional)"
+    unified = legend_style != "Separate (default)"
+    # Scores are stored as float32; round so the JSON (and tooltips) show 72.5, not 72.5000000001
+    records = df[["KPI", "Average Score", "Green", "Amber", "Red"]].astype({"KPI": str, "Average Score": float}).round(
+        {"Average Score": 2}).to_dict("records")
+
+    x = {"field": "KPI", "type": "nominal", "sort": None, "axis": {"labelAngle": -90, "title": None}}
+    if unified:
+        status_legend = band_legend = {"orient": "bottom", "direction": "horizontal", "title": None}
+    else:
+        status_legend = {"orient": "top", "direction": "horizontal", "title": None}
+        band_legend = {"orient": "right", "title": None}
+
+    # Bars and segment labels share one stack transform so they line up exactly
+    stacked = [
+        {"fold": [column for column, *_ in STATUSES], "as": ["Status", "Count"]},
+        {"calculate": " : ".join(f"datum.Status == '{column}' ? {i}" for i, (column, *_) in enumerate(STATUSES)) + f" : {len(STATUSES)}",
+         "as": "Order"},
+        {"calculate": " : ".join(f"datum.Status == '{column}' ? '{label}'" for column, _, label, _ in STATUSES) + " : ''",
+         "as": "Series"},
+        {"stack": "Count", "groupby": ["KPI"], "sort": [{"field": "Order"}],
+         "offset": "normalize" if proportional else "zero", "as": ["y0", "y1"]},
+    ]
+    if proportional:
+        stacked.append({"calculate": "datum.y0 * 100", "as": "y0"})
+        stacked.append({"calculate": "datum.y1 * 100", "as": "y1"})
+    stacked.append({"calculate": "(datum.y0 + datum.y1) / 2", "as": "ymid"})
+
+    y_title = "Proportion (%)" if proportional else "Number of Projects"
+    y_scale = {"domain": [0, 100]} if proportional else ({"domain": [0, ymax]} if ymax else {})
+    bars = {
+        "transform": stacked,
+        "mark": {"type": "bar"},
+        "encoding": {
+            "x": x,
+            "y": {"field": "y0", "type": "quantitative", "title": y_title, "scale": y_scale},
+            "y2": {"field": "y1"},
+            "color": {
+                "field": "Series", "type": "nominal",
+                "scale": {"domain": [label for _, _, label, _ in STATUSES], "range": [color for _, color, _, _ in STATUSES]},
+                "legend": status_legend,
+            },
+            "tooltip": [
+                {"field": "KPI", "type": "nominal"},
+                {"field": "Status", "type": "nominal"},
+                {"field": "Count", "type": "quantitative"},
+                {"field": "Average Score", "type": "quantitative"},
+            ],
+        },
+    }
+    bar_layers = [bars]
+
+    if label_option == "Show total only":
+        total = "100" if proportional else "datum.Green + datum.Amber + datum.Red"
+        bar_layers.append({
+            "transform": [{"calculate": total, "as": "Total"}],
+            "mark": {"type": "text", "baseline": "bottom", "dy": -2, "fontWeight": "bold", "fontSize": 11},
+            "encoding": {"x": x, "y": {"field": "Total", "type": "quantitative"},
+                         "text": {"field": "Total", "type": "quantitative", "format": "d"}},
+        })
+    elif label_option == "Show all segment labels":
+        for column, _, _, text_color in STATUSES:
+            bar_layers.append({
+                "transform": stacked + [{"filter": f"datum.Status == '{column}' && datum.Count > 0"},
+                                        {"calculate": "datum.y1 - datum.y0", "as": "Segment"}],
+                "mark": {"type": "text", "color": text_color, "fontWeight": "bold", "fontSize": 10},
+                "encoding": {"x": x, "y": {"field": "ymid", "type": "quantitative"},
+                             "text": {"field": "Segment", "type": "quantitative", "format": "d"}},
+            })
+
+    # Score line on its own 0-100 axis
+    score_y = {"field": "Average Score", "type": "quantitative", "scale": {"domain": [0, 100]},
+               "axis": {"orient": "right", "title": "Average Score (%)"}}
+    score_layers = [{
+        "mark": {"type": "line", "color": "black", "strokeWidth": 1},
+        "encoding": {"x": x, "y": score_y, "tooltip": [{"field": "KPI"}, {"field": "Average Score"}]},
+    }]
+    if score_line_style == "Colored dots by score":
+        score_layers.append({
+            "transform": [{"calculate": score_band_expr(), "as": "Band"}],
+            "mark": {"type": "point", "filled": True, "size": 80, "opacity": 1, "stroke": "black", "strokeWidth": 0.5},
+            "encoding": {
+                "x": x,
+                "y": score_y,
+                "color": {"field": "Band", "type": "nominal",
+                          "scale": {"domain": [label for _, _, label in SCORE_BANDS],
+                                    "range": [color for _, color, _ in SCORE_BANDS]},
+                          "legend": band_legend},
+                "tooltip": [{"field": "KPI"}, {"field": "Average Score"}],
+            },
+        })
+
+    return {
+        "$schema": VEGA_LITE_SCHEMA,
+        "title": chart_title.strip() or "KPI Chart",
+        "data": {"values": records},
+        "width": "container",
+        "height": 420,
+        "layer": [
+            {"layer": bar_layers},
+            {"layer": score_layers},
+        ],
+        "resolve": {"scale": {"y": "independent", "color": "independent"}},
+    }